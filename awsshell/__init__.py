@@ -1,8 +1,10 @@
 from __future__ import unicode_literals, print_function
 
-import json
+import os
+import sys
 import argparse
-import threading
+import functools
+import subprocess
 
 from awsshell import shellcomplete
 from awsshell import autocomplete
@@ -10,11 +12,16 @@ from awsshell import app
 from awsshell import docs
 from awsshell import loaders
 from awsshell.index import completion
+from awsshell.index import registry
 from awsshell import utils
+from awsshell import compat
 
 
 __version__ = '0.2.0'
 
+# The errors of the process writing the doc index.
+DOC_INDEX_LOG = utils.build_config_file_path('doc-index.log')
+
 
 def determine_doc_index_filename():
     import awscli
@@ -23,51 +30,151 @@ def determine_doc_index_filename():
     return base + '.docs'
 
 
+def find_previous_doc_index_filename(dirname=None):
+    """Return the doc index of the newest other CLI version, if any.
+
+    Defaults to the directory of the per user doc index.
+
+    """
+    import awscli
+    default_dirname, template = os.path.split(
+        loaders.JSONIndexLoader.index_filename('%s') + '.docs')
+    if dirname is None:
+        dirname = default_dirname
+    filenames = utils.other_versions(
+        utils.FSLayer().list_files(dirname), template, awscli.__version__)
+    if not filenames:
+        return None
+    return os.path.join(dirname, filenames[0])
+
+
 def load_index(filename):
     load = loaders.JSONIndexLoader()
     return load.load_index(filename)
 
 
+def start_index_build(index_registry):
+    """Create a builder for the completion index of the installed CLI.
+
+    The shell starts with the top level commands, and the services
+    are added to the index as they're indexed (see
+    :class:`awsshell.makeindex.BackgroundIndexBuilder`).  The registry
+    hands out the index that's being built.
+
+    """
+    from awsshell.makeindex import BackgroundIndexBuilder
+    # TODO: Using internal method, but this will eventually
+    # be moved into the CompletionIndex class anyways.
+    indexer = index_registry.completion_index
+    index_file = indexer._filename_for_version(utils.AWSCLI_VERSION)
+    # The services that didn't change since the last version of the
+    # CLI we indexed are copied from its index.  It's loaded by the
+    # builder's thread, so it doesn't hold up the shell.
+    index_builder = BackgroundIndexBuilder(
+        index_file, load_previous_index=functools.partial(
+            indexer.load_previous_index_data, utils.AWSCLI_VERSION))
+    index_registry.set_index(index_builder.index_data)
+    return index_builder
+
+
+def start_doc_index_build(doc_index_file):
+    """Start writing the doc index in a separate process.
+
+    Rendering the docs is CPU heavy, so it's done by
+    :func:`awsshell.makeindex.write_user_doc_index` in a low priority
+    process with its own pool of workers.  The shell only reads the
+    doc index, the docs of each service are available as soon as
+    they're written.
+
+    The process's errors are written to ``DOC_INDEX_LOG``.
+
+    :rtype: subprocess.Popen
+    :return: The process writing the doc index.
+
+    """
+    log_dir = os.path.dirname(DOC_INDEX_LOG)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    with open(os.devnull, 'w') as devnull:
+        with open(DOC_INDEX_LOG, 'w') as log:
+            return subprocess.Popen(
+                [sys.executable, '-m', 'awsshell.makeindex',
+                 '--user-doc-index', doc_index_file],
+                stdin=devnull, stdout=devnull, stderr=log,
+                **compat.LOW_PRIORITY_POPEN_KWARGS)
+
+
+def stop_doc_index_build(process):
+    """Stop writing the doc index if it isn't done yet.
+
+    If the process already exited with an error, the error is
+    reported, otherwise the shell would try to write the doc index
+    on every start without saying why it never finishes.
+
+    """
+    returncode = process.poll()
+    if returncode is None:
+        process.terminate()
+        process.wait()
+    elif returncode != 0:
+        print("Unable to create the doc index (exit status %s), see %s "
+              "for details." % (returncode, DOC_INDEX_LOG))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-p', '--profile', help='The profile name to use '
                         'when starting the AWS Shell.')
     args = parser.parse_args()
 
-    indexer = completion.CompletionIndex()
+    # The index is loaded once and shared with everything
+    # else that needs it, e.g. the lexer.
+    index_registry = registry.DEFAULT_REGISTRY
+    index_builder = None
     try:
-        index_str = indexer.load_index(utils.AWSCLI_VERSION)
-        index_data = json.loads(index_str)
+        index_data = index_registry.get_index()
+    except completion.IndexValidationError as e:
+        print("The autocomplete index is invalid (%s), rebuilding it "
+              "in the background..." % e)
+        index_builder = start_index_build(index_registry)
     except completion.IndexLoadError:
-        print("First run, creating autocomplete index...")
-        from awsshell.makeindex import write_index
-        # TODO: Using internal method, but this will eventually
-        # be moved into the CompletionIndex class anyways.
-        index_file = indexer._filename_for_version(utils.AWSCLI_VERSION)
-        write_index(index_file)
-        index_str = indexer.load_index(utils.AWSCLI_VERSION)
-        index_data = json.loads(index_str)
-    doc_index_file = determine_doc_index_filename()
-    from awsshell.makeindex import write_doc_index
+        print("First run, creating autocomplete index in the background...")
+        index_builder = start_index_build(index_registry)
+    if index_builder is not None:
+        index_data = index_builder.index_data
+    # A complete, shared doc index is used if there is one.
+    doc_index_file = docs.find_doc_index(
+        determine_doc_index_filename(), utils.shared_index_dirs())
     doc_data = docs.load_lazy_doc_index(doc_index_file)
-    # There's room for improvement here.  If the docs didn't finish
-    # generating, we regen the whole doc index.  Ideally we pick up
-    # from where we left off.
+    # If the docs didn't finish generating, the build picks up
+    # from the last service it finished.
+    doc_builder = None
     try:
         docs.load_doc_db(doc_index_file)['__complete__']
     except KeyError:
         print("Creating doc index in the background. "
               "It will be a few minutes before all documentation is "
               "available.")
-        t = threading.Thread(target=write_doc_index, args=(doc_index_file,))
-        t.daemon = True
-        t.start()
+        doc_builder = start_doc_index_build(doc_index_file)
     model_completer = autocomplete.AWSCLIModelCompleter(index_data)
     completer = shellcomplete.AWSShellCompleter(model_completer)
-    shell = app.create_aws_shell(completer, model_completer, doc_data)
+    shell = app.create_aws_shell(completer, model_completer, doc_data,
+                                 index_builder=index_builder)
     if args.profile:
         shell.profile = args.profile
-    shell.run()
+    if index_builder is not None:
+        def on_index_update():
+            model_completer.index_changed()
+            shell.request_redraw()
+        index_builder.on_update = on_index_update
+        index_builder.start()
+    try:
+        shell.run()
+    finally:
+        if index_builder is not None:
+            index_builder.stop()
+        if doc_builder is not None:
+            stop_doc_index_build(doc_builder)
 
 
 if __name__ == '__main__':
@@ -32,8 +32,9 @@ LOG = logging.getLogger(__name__)
 EXIT_REQUESTED = object()
 
 
-def create_aws_shell(completer, model_completer, docs):
-    return AWSShell(completer, model_completer, docs)
+def create_aws_shell(completer, model_completer, docs, index_builder=None):
+    return AWSShell(completer, model_completer, docs,
+                    index_builder=index_builder)
 
 
 class InputInterrupt(Exception):
@@ -222,12 +223,19 @@ class AWSShell(object):
     :type theme: str
     :param theme: The pygments theme.
 
+    :type index_builder: :class:`awsshell.makeindex.BackgroundIndexBuilder`
+    :param index_builder: If the completion index is being built in the
+        background, the builder, used to show the progress of the build
+        in the toolbar.
+
     """
 
     def __init__(self, completer, model_completer, docs,
-                 input=None, output=None, popen_cls=None):
+                 input=None, output=None, popen_cls=None,
+                 index_builder=None):
         self.completer = completer
         self.model_completer = model_completer
+        self.index_builder = index_builder
         self.history = InMemoryHistory()
         self.file_history = FileHistory(build_config_file_path('history'))
         self._cli = None
@@ -419,7 +427,8 @@ class AWSShell(object):
             lambda: self.model_completer.match_fuzzy,
             lambda: self.enable_vi_bindings,
             lambda: self.show_completion_columns,
-            lambda: self.show_help)
+            lambda: self.show_help,
+            self.index_progress)
         style_factory = StyleFactory(self.theme)
         buffers = {
             'clidocs': Buffer(read_only=True)
@@ -443,6 +452,22 @@ class AWSShell(object):
             key_bindings_registry=self.key_manager.manager.registry,
         )
 
+    def index_progress(self):
+        """Return the progress of the index build, if it's running.
+
+        Nothing is reported once the build is over, even if it failed.
+
+        """
+        builder = self.index_builder
+        if builder is None or builder.done:
+            return None
+        return builder.progress
+
+    def request_redraw(self):
+        """Redraw the cli.  This is safe to call from any thread."""
+        if self._cli is not None:
+            self._cli.request_redraw()
+
     def on_input_timeout(self, cli):
         if not self.show_help:
             return
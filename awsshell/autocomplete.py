@@ -1,6 +1,90 @@
 from __future__ import print_function
-from awsshell.fuzzy import fuzzy_search
-from awsshell.substring import substring_search
+import re
+from collections import namedtuple
+
+from awsshell.fuzzy import fuzzy_search, FuzzySession, FuzzyCorpus
+from awsshell.index.records import IndexNode
+from awsshell.substring import PrefixIndex
+from awsshell.utils import LayeredMapping, LRUCache
+
+
+_TOKEN_REGEX = re.compile(r'\S+')
+# The number of completion results AWSCLIModelCompleter.autocomplete()
+# remembers, see AWSCLIModelCompleter.completion_cache.
+COMPLETION_CACHE_SIZE = 256
+
+# The completion context after a token on the line has been consumed.
+# word - The token that was consumed, e.g. 'ec2'.
+# end - The index of the whitespace char that terminated the token.
+# node - The index node for the current command.
+# cmd_path - A tuple of the commands traversed so far, e.g.
+#   ('aws', 'ec2', 'run-instances').
+# last_option - The last option seen on the line, e.g. '--instance-ids'.
+_TokenContext = namedtuple('_TokenContext',
+                           ['word', 'end', 'node', 'cmd_path', 'last_option'])
+
+# The result of AWSCLIModelCompleter.complete().
+# completions - A list of completion strings.
+# cmd_path - The commands for the completion context,
+#   e.g. ['aws', 'ec2', 'run-instances'].
+# last_option - The last option on the line, e.g. '--instance-ids'.
+# arg_metadata - The argument metadata for the completion context.
+# word - The word being completed.
+CompletionResult = namedtuple('CompletionResult',
+                              ['completions', 'cmd_path', 'last_option',
+                               'arg_metadata', 'word'])
+
+
+def _common_prefix_length(first, second):
+    # The common cases are typing at, or deleting from, the end of
+    # the line so we check for those first.
+    if second.startswith(first):
+        return len(first)
+    elif first.startswith(second):
+        return len(second)
+    max_length = min(len(first), len(second))
+    i = 0
+    while i < max_length and first[i] == second[i]:
+        i += 1
+    return i
+
+
+class _CandidateTable(object):
+    """Completion candidates for a single node in the index.
+
+    The candidates only depend on the index, so they're computed
+    once the first time a node is visited and are then only read
+    on every keystroke.
+
+    """
+    def __init__(self, node, global_options, global_arg_metadata):
+        self.node = node
+        self.command_index = PrefixIndex(node.commands)
+        self.command_corpus = FuzzyCorpus(node.commands)
+        if node.arguments != global_options:
+            arguments = list(node.arguments) + list(global_options)
+        else:
+            arguments = node.arguments
+        self.arguments = tuple(arguments)
+        self.argument_index = PrefixIndex(arguments)
+        self.argument_corpus = FuzzyCorpus(arguments)
+        # Arguments specific to this node take precedence
+        # over the global arguments.
+        self.arg_metadata = LayeredMapping(
+            node.argument_metadata, global_arg_metadata)
+
+    def match_commands(self, word, match_fuzzy, fuzzy=fuzzy_search):
+        return self._match(word, self.command_corpus,
+                           self.command_index, match_fuzzy, fuzzy)
+
+    def match_arguments(self, word, match_fuzzy, fuzzy=fuzzy_search):
+        return self._match(word, self.argument_corpus,
+                           self.argument_index, match_fuzzy, fuzzy)
+
+    def _match(self, word, candidates, prefix_index, match_fuzzy, fuzzy):
+        if match_fuzzy:
+            return fuzzy(word, candidates)
+        return prefix_index.search(word)
 
 
 class AWSCLIModelCompleter(object):
@@ -9,139 +93,283 @@ class AWSCLIModelCompleter(object):
     This class consumes indexed data based on the JSON models from
     AWS service (which we pull through botocore's data loaders).
 
+    The index can either be made of
+    :class:`awsshell.index.records.IndexNode` instances, as returned
+    by the index loader, or of the dicts in the JSON index, which are
+    converted to ``IndexNode`` instances.
+
     """
-    def __init__(self, index_data, match_fuzzy=True):
-        self._index = index_data
+    def __init__(self, index_data, match_fuzzy=True,
+                 cache_size=COMPLETION_CACHE_SIZE):
         self._root_name = 'aws'
-        self._global_options = index_data[self._root_name]['arguments']
+        self._root = IndexNode.from_dict(index_data[self._root_name])
+        self._global_options = self._root.arguments
         # These values mutate as autocompletions occur.
         # They track state to improve the autocompletion speed.
         self._current_name = 'aws'
-        self._current = index_data[self._root_name]
-        self._last_position = 0
+        self._current = self._root
         self._current_line = ''
+        # One _TokenContext for every completed token in
+        # self._current_line, see _update_context().
+        self._token_stack = []
         self.last_option = ''
         # This will get populated as a command is completed.
         self.cmd_path = [self._current_name]
         self.match_fuzzy = match_fuzzy
+        # id(node) -> _CandidateTable
+        self._candidate_tables = {}
+        self._fuzzy_session = None
+        # Users often retype the same words, so autocomplete()
+        # remembers the completions it computed, keyed by
+        # (_CandidateTable, word, match_fuzzy).
+        self.completion_cache = LRUCache(cache_size)
+        self._index_changed = False
 
     @property
     def global_arg_metadata(self):
-        return self._index[self._root_name]['argument_metadata']
+        return self._root.argument_metadata
 
     @property
     def arg_metadata(self):
         # Returns the required arguments for the current level.
-        return self._current.get('argument_metadata', {})
+        return self._current.argument_metadata
+
+    @property
+    def all_arg_metadata(self):
+        # The argument metadata for the current level
+        # merged with the global argument metadata.
+        return self._candidate_table(self._current).arg_metadata
 
     def reset(self):
         # Resets all the state.  Called after a user runs
         # a command.
         self._current_name = self._root_name
-        self._current = self._index[self._root_name]
-        self._last_position = 0
+        self._current = self._root
+        self._current_line = ''
+        self._token_stack = []
         self.last_option = ''
         self.cmd_path = [self._current_name]
 
+    def index_changed(self):
+        """Let the completer know that commands were added to the index.
+
+        This happens when the index is built in the background (see
+        :class:`awsshell.makeindex.BackgroundIndexBuilder`).  It's safe
+        to call from any thread, the next call to ``autocomplete()``
+        will parse the line from the start so it can find the new
+        commands.
+
+        """
+        self._index_changed = True
+
     def autocomplete(self, line):
         """Given a line, return a list of suggestions."""
-        current_length = len(line)
-        self._current_line = line
-        if current_length == 1 and self._last_position > 1:
-            # Reset state.  This is likely from a user completing
-            # a previous command.
-            self.reset()
-        elif current_length < self._last_position:
-            # The user has hit backspace.  We'll need to check
-            # the current words.
-            return self._handle_backspace()
-        elif not line:
+        if self._index_changed:
+            self._index_changed = False
+            # A token that was consumed before the change may
+            # be a command that wasn't in the index yet.
+            self._token_stack = []
+            self._current_line = ''
+        last_word = self._update_context(line)
+        return self._completions_for_context(
+            line, self._current, last_word, self.match_fuzzy,
+            fuzzy=self._incremental_fuzzy_search,
+            cache=self.completion_cache)
+
+    def complete(self, line, cursor=None, match_fuzzy=None):
+        """Return the completions for a line without changing any state.
+
+        Unlike ``autocomplete()``, this method does not depend on the
+        previous calls that were made, so it can complete any line
+        in any order.  It does not modify the completer so it's safe
+        to call from multiple threads.
+
+        :type line: str
+        :param line: The command line to complete, without the
+            leading ``aws``, e.g. ``ec2 describe-inst``.
+
+        :type cursor: int
+        :param cursor: The position of the cursor in ``line``.  Only the
+            text before the cursor is used to complete.  Defaults to
+            the end of the line.
+
+        :type match_fuzzy: bool
+        :param match_fuzzy: Whether to fuzzy match or substring match.
+            Defaults to the ``match_fuzzy`` attribute.
+
+        :rtype: CompletionResult
+        :return: The completions along with the context they
+            were computed in.
+
+        """
+        if cursor is None:
+            cursor = len(line)
+        if match_fuzzy is None:
+            match_fuzzy = self.match_fuzzy
+        line = line[:cursor]
+        context, last_word = self._consume_line(
+            line, self._root_context(), [])
+        completions = self._completions_for_context(
+            line, context.node, last_word, match_fuzzy)
+        return CompletionResult(
+            completions=completions,
+            cmd_path=list(context.cmd_path),
+            last_option=self._last_option(context, last_word),
+            arg_metadata=context.node.argument_metadata,
+            word=last_word)
+
+    def _completions_for_context(self, line, node, last_word, match_fuzzy,
+                                 fuzzy=fuzzy_search, cache=None):
+        if not line:
             return []
-        elif current_length != self._last_position + 1:
-            return self._complete_from_full_parse()
-
-        # This position is important.  We only update the _last_position
-        # after we've checked the special cases above where that value
-        # matters.
-        self._last_position = len(line)
-        if line and not line.strip():
+        if not line.strip():
             # Special case, the user hits a space on a new line so
             # we autocomplete all the top level commands.
-            return self._current['commands']
-
-        last_word = line.split()[-1]
-        if last_word in self.arg_metadata or last_word in self._global_options:
-            # The last thing we completed was an argument, record
-            # this as self.last_arg
-            self.last_option = last_word
-        if line[-1] == ' ':
+            return node.commands
+        if line[-1].isspace():
             # At this point the user has autocompleted a command
             # or an argument and has hit space.  If they've
-            # just completed a command, we need to change the
-            # current context and traverse into the subcommand.
+            # just completed a command, the context has already
+            # traversed into the subcommand.
             # "ec2 "
-            #      ^--here, need to traverse into "ec2"
+            #      ^--here, we're now in the "ec2" context.
             #
             # Otherwise:
             # "ec2 --no-validate-ssl "
             #                        ^-- here, stay on "ec2" context.
-            if not last_word.startswith('-'):
-                next_command = self._current['children'].get(last_word)
-                if next_command is not None:
-                    self._current = next_command
-                    self._current_name = last_word
-                    self.cmd_path.append(self._current_name)
-            elif last_word in self.arg_metadata and \
-                    self.arg_metadata[last_word]['example']:
+            arg_metadata = node.argument_metadata
+            if last_word.startswith('-') and \
+                    last_word in arg_metadata and \
+                    arg_metadata[last_word]['example']:
                 # Then this is an arg with a shorthand example so we'll
                 # suggest that example.
-                return [self.arg_metadata[last_word]['example']]
+                return [arg_metadata[last_word]['example']]
             # Even if we don't change context, we still want to
             # autocomplete all the commands for the current context
             # in either of the above two cases.
-            return self._current['commands'][:]
-        elif last_word.startswith('-'):
-            # TODO: cache this for the duration of the current context.
-            # We don't need to recompute this until the args are
-            # different.
-            all_args = self._get_all_args()
-            if self.match_fuzzy:
-                return fuzzy_search(last_word, all_args)
-            else:
-                return substring_search(last_word, all_args)
-        if self.match_fuzzy:
-            return fuzzy_search(last_word, self._current['commands'])
-        else:
-            return substring_search(last_word, self._current['commands'])
+            return list(node.commands)
+        table = self._candidate_table(node)
+        if cache is None:
+            return self._match_table(table, last_word, match_fuzzy, fuzzy)
+        # The table is part of the key, rather than the node's id,
+        # so the key can't match a different node that was later
+        # allocated at the same address.
+        key = (table, last_word, match_fuzzy)
+        completions = cache.get(key)
+        if completions is None:
+            completions = self._match_table(
+                table, last_word, match_fuzzy, fuzzy)
+            cache.put(key, completions)
+        # Callers are free to modify the list they're given.
+        return list(completions)
+
+    def _match_table(self, table, last_word, match_fuzzy, fuzzy):
+        if last_word.startswith('-'):
+            return table.match_arguments(last_word, match_fuzzy, fuzzy)
+        return table.match_commands(last_word, match_fuzzy, fuzzy)
+
+    def _incremental_fuzzy_search(self, word, corpus):
+        # As the user types, we'll keep searching the same corpus
+        # with a longer word, so we keep a FuzzySession for the
+        # corpus we're currently completing.
+        session = self._fuzzy_session
+        if session is None or session.corpus is not corpus:
+            session = FuzzySession(corpus)
+            self._fuzzy_session = session
+        return session.search(word)
+
+    def _candidate_table(self, node):
+        table = self._candidate_tables.get(id(node))
+        if table is None or table.node is not node:
+            table = _CandidateTable(node, self._global_options,
+                                    self.global_arg_metadata)
+            self._candidate_tables[id(node)] = table
+        return table
+
+    def _root_context(self):
+        return _TokenContext(
+            word='', end=-1, node=self._root,
+            cmd_path=(self._root_name,), last_option='')
 
-    def _get_all_args(self):
-        if self._current['arguments'] != self._global_options:
-            all_args = self._current['arguments'] + self._global_options
+    def _update_context(self, line):
+        # Bring the completion context in sync with ``line`` and
+        # return the last word on the line.
+        #
+        # Every token that has been terminated by whitespace has a
+        # _TokenContext on self._token_stack describing the context
+        # after that token was consumed.  Rather than reparsing the
+        # whole line on every call, we only pop the contexts for the
+        # tokens that changed since the last call and walk forward
+        # from there.  When the user types one char at a time this
+        # is constant work, and a backspace, paste, or edit in the
+        # middle of the line only costs as much as the tokens that
+        # were affected by the edit.
+        unchanged = _common_prefix_length(self._current_line, line)
+        stack = self._token_stack
+        # A token's context stays valid as long as the token and
+        # the whitespace that terminated it are unchanged.
+        while stack and stack[-1].end >= unchanged:
+            stack.pop()
+        if stack:
+            context = stack[-1]
         else:
-            all_args = self._current['arguments']
-        return all_args
-
-    def _handle_backspace(self):
-        return self._complete_from_full_parse()
-
-    def _complete_from_full_parse(self):
-        # We try to avoid calling this, but this is necessary
-        # sometimes.  In this scenario, we're resetting everything
-        # and starting from the very beginning and reparsing
-        # everything.
-        # This is a naive implementation for now.  This
-        # can be optimized.
-        self.reset()
-        line = self._current_line
-        for i in range(1, len(self._current_line)):
-            self.autocomplete(line[:i])
-        return self.autocomplete(line)
+            context = self._root_context()
+        context, last_word = self._consume_line(line, context, stack)
+        self._current_line = line
+        self._current = context.node
+        self._current_name = context.cmd_path[-1]
+        self.cmd_path = list(context.cmd_path)
+        self.last_option = self._last_option(context, last_word)
+        return last_word
+
+    def _consume_line(self, line, context, consumed):
+        # Consume the completed tokens in ``line`` that come after
+        # ``context``, appending each new context to ``consumed``.
+        # Returns the final context and the last word on the line.
+        last_word = context.word
+        for match in _TOKEN_REGEX.finditer(line, context.end + 1):
+            last_word = match.group()
+            if match.end() == len(line):
+                # The user is still typing this word.  It doesn't
+                # get a context until it's terminated by whitespace.
+                break
+            context = self._consume_token(context, last_word, match.end())
+            consumed.append(context)
+        return context, last_word
+
+    def _last_option(self, context, last_word):
+        if self._is_option(context.node, last_word):
+            # The last thing we completed was an argument.
+            return last_word
+        return context.last_option
+
+    def _consume_token(self, context, word, end):
+        # Return the context after consuming a completed token.
+        node = context.node
+        cmd_path = context.cmd_path
+        last_option = context.last_option
+        if self._is_option(node, word):
+            last_option = word
+        if not word.startswith('-'):
+            # If the word is a subcommand of the current context
+            # we traverse into it.  Anything else (e.g. the value of
+            # an option) leaves the context unchanged.
+            child = node.children.get(word)
+            if child is not None:
+                node = child
+                cmd_path = cmd_path + (word,)
+        return _TokenContext(word=word, end=end, node=node,
+                             cmd_path=cmd_path, last_option=last_option)
+
+    def _is_option(self, node, word):
+        return (word in node.argument_metadata or
+                word in self._global_options)
 
     def _autocomplete_options(self, last_word):
         global_args = []
         # Autocomplete argument names.
         current_arg_completions = [
-            cmd for cmd in self._current['arguments']
+            cmd for cmd in self._current.arguments
             if cmd.startswith(last_word)]
         if self._current_name != self._root_name:
             # Also autocomplete global arguments.
@@ -1,4 +1,5 @@
 from __future__ import print_function
+import os
 import sys
 import platform
 
@@ -11,11 +12,13 @@ if PY3:
     from html.parser import HTMLParser
     text_type = str
     from io import StringIO
+    from collections.abc import Mapping
     import dbm
 else:
     from HTMLParser import HTMLParser
     text_type = unicode
     from cStringIO import StringIO
+    from collections import Mapping
     import anydbm as dbm
 
 
@@ -25,3 +28,24 @@ if ON_WINDOWS:
 else:
     def default_editor():
         return 'vi'
+
+
+if ON_WINDOWS:
+    # From the win32 API, subprocess only has this constant on 3.7+.
+    BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+    LOW_PRIORITY_POPEN_KWARGS = {'creationflags': BELOW_NORMAL_PRIORITY_CLASS}
+else:
+    # The priority is lowered by the process itself, with os.nice().
+    LOW_PRIORITY_POPEN_KWARGS = {}
+
+
+if PY3:
+    replace_file = os.replace
+elif ON_WINDOWS:
+    def replace_file(src, dst):
+        # os.rename() won't replace an existing file on windows.
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+else:
+    replace_file = os.rename
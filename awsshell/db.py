@@ -3,24 +3,48 @@ import os
 import sqlite3
 
 
+# Most docs are a few KB, a larger page keeps them off overflow pages.
+PAGE_SIZE = 8192
+
+
 class ConcurrentDBM(object):
+    """A key value store backed by sqlite.
+
+    Databases are created in WAL mode, so the shell can read docs
+    while the doc index is being written by another process, without
+    waiting for its transactions to commit.  Writes are only synced
+    to disk when the WAL is checkpointed, see :meth:`update` for
+    writing many keys in a single transaction.
+
+    """
 
     @classmethod
     def open(cls, filename, create=False):
         if create and not os.path.isfile(filename):
             return cls.create(filename)
         else:
-            db = sqlite3.connect(filename)
+            db = cls._connect(filename)
             return cls(db)
 
     @classmethod
     def create(cls, filename):
-        db = sqlite3.connect(filename)
+        db = cls._connect(filename)
+        # The page size has to be set before the table is created.
+        db.execute('PRAGMA page_size = %d' % PAGE_SIZE)
+        db.execute('PRAGMA journal_mode = WAL')
         with db:
             db.execute(
                 'CREATE TABLE docindex (key TEXT PRIMARY KEY, value TEXT)')
         return cls(db)
 
+    @staticmethod
+    def _connect(filename):
+        db = sqlite3.connect(filename)
+        # In WAL mode this is still durable across application
+        # crashes, commits just don't wait for an fsync.
+        db.execute('PRAGMA synchronous = NORMAL')
+        return db
+
     def __init__(self, db):
         self._db = db
 
@@ -36,11 +60,55 @@ class ConcurrentDBM(object):
         raise KeyError(key)
 
     def __setitem__(self, key, value):
+        self.update([(key, value)])
+
+    def update(self, items):
+        """Set the (key, value) pairs in ``items`` in one transaction.
+
+        Either every key is written, or none of them are.
+
+        """
         with self._db:
-            self._db.execute(
+            self._db.executemany(
                 'INSERT OR REPLACE INTO docindex (key, value) '
                 'VALUES (:key, :value)',
-                {'key': key, 'value': value})
+                ({'key': key, 'value': value} for key, value in items))
+
+    def items(self, prefix='', suffix=''):
+        """Return the (key, value) pairs whose key starts with ``prefix``.
+
+        If ``suffix`` is given, only the keys that also end with
+        ``suffix`` are returned.
+
+        """
+        conditions = []
+        params = {}
+        if prefix:
+            # Every key that starts with the prefix sorts between the
+            # prefix and the prefix with its last char incremented.
+            conditions.append('key >= :start AND key < :end')
+            params['start'] = prefix
+            params['end'] = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        if suffix:
+            conditions.append('substr(key, -:length) = :suffix')
+            params['length'] = len(suffix)
+            params['suffix'] = suffix
+        query = 'SELECT key, value FROM docindex'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        cursor = self._db.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def disable_wal(self):
+        """Checkpoint the WAL and switch to a rollback journal.
+
+        A database in WAL mode can only be opened by users that can
+        create files in its directory, so this should be called on
+        a database before it's shared read only.
+
+        """
+        self._db.execute('PRAGMA journal_mode = DELETE')
 
     def close(self):
         self._db.close()
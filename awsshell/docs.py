@@ -1,10 +1,36 @@
 from __future__ import unicode_literals
+import os
+import sys
+import logging
+import sqlite3
+import threading
+import functools
+
 from awsshell import db
+from awsshell.utils import LRUCache
+
+
+LOG = logging.getLogger(__name__)
+# The default size of the docs cached by a DocRetriever, in bytes.
+DEFAULT_CACHE_SIZE = 8 * 1024 * 1024
+
+
+# The docs of each command are split into sections when they're
+# indexed, see awsshell.makeindex.split_doc_sections().  Each section
+# is stored under the command's dotted name, this separator, and the
+# name of the section, e.g. 'aws.ec2.run-instances#--instance-ids'.
+SECTION_SEPARATOR = '#'
+
+
+def section_key(dot_cmd, section):
+    """Return the doc index key of a section of a command's docs."""
+    return dot_cmd + SECTION_SEPARATOR + section
 
 
 def load_lazy_doc_index(filename):
     d = load_doc_db(filename)
-    return DocRetriever(d)
+    return DocRetriever(
+        d, open_doc_index=functools.partial(db.ConcurrentDBM.open, filename))
 
 
 def load_doc_db(filename):
@@ -12,16 +38,85 @@ def load_doc_db(filename):
     return d
 
 
+def find_doc_index(filename, search_dirs):
+    """Find a complete doc index that's shared by every user.
+
+    :type filename: str
+    :param filename: The per user doc index.
+
+    :type search_dirs: list
+    :param search_dirs: The shared index directories, see
+        :func:`awsshell.utils.shared_index_dirs`.
+
+    :return: The first complete doc index in ``search_dirs`` with the
+        same name as ``filename``, or ``filename`` if there isn't one.
+
+    """
+    basename = os.path.basename(filename)
+    for dirname in search_dirs:
+        shared_filename = os.path.join(dirname, basename)
+        if os.path.isfile(shared_filename) and \
+                _is_complete(shared_filename):
+            return shared_filename
+    return filename
+
+
+def _is_complete(filename):
+    try:
+        d = db.ConcurrentDBM.open(filename)
+    except sqlite3.Error:
+        return False
+    try:
+        d['__complete__']
+        return True
+    except (KeyError, sqlite3.Error):
+        return False
+    finally:
+        d.close()
+
+
 class DocRetriever(object):
-    """Retrieve documentation for the AWS CLI."""
-    def __init__(self, doc_index):
+    """Retrieve documentation for the AWS CLI.
+
+    The docs are kept in a :class:`DocCache` of up to ``cache_size``
+    bytes, so the docs of the command being typed are only read from
+    the doc index once.
+
+    If ``open_doc_index`` is given, it's called to open another
+    connection to the doc index.  The first time the docs of a
+    service's command are retrieved, a background thread uses that
+    connection to load the descriptions of all the service's commands
+    into the cache.
+
+    """
+    def __init__(self, doc_index, cache_size=DEFAULT_CACHE_SIZE,
+                 open_doc_index=None):
         # Internally, most of the speedup comes from
         # the fact that this data is pre-rendered and
         # indexed.
         self._doc_index = doc_index
-        self._cache = {}
+        self._cache = DocCache(cache_size)
+        self._prefetcher = None
+        if open_doc_index is not None:
+            self._prefetcher = _Prefetcher(open_doc_index, self._cache)
 
     def extract_description(self, dot_cmd):
+        dot_cmd = _decode(dot_cmd)
+        self._prefetch(dot_cmd)
+        key = section_key(dot_cmd, 'description')
+        docs = self._cache.get(key)
+        if docs is None:
+            docs = self._load_description(dot_cmd, key)
+            self._cache.put(key, docs)
+        return docs
+
+    def _load_description(self, dot_cmd, key):
+        try:
+            return self._doc_index[key]
+        except KeyError:
+            pass
+        # The doc index was written before the docs were split into
+        # sections, so we have to find the section in the full docs.
         try:
             docs = self._doc_index[dot_cmd]
         except KeyError:
@@ -32,6 +127,20 @@ class DocRetriever(object):
         return docs
 
     def extract_param(self, dot_cmd, param_name):
+        dot_cmd = _decode(dot_cmd)
+        self._prefetch(dot_cmd)
+        key = section_key(dot_cmd, param_name)
+        docs = self._cache.get(key)
+        if docs is None:
+            docs = self._load_param(dot_cmd, param_name, key)
+            self._cache.put(key, docs)
+        return docs
+
+    def _load_param(self, dot_cmd, param_name, key):
+        try:
+            return self._doc_index[key]
+        except KeyError:
+            pass
         try:
             docs = self._doc_index[dot_cmd]
         except KeyError:
@@ -40,3 +149,112 @@ class DocRetriever(object):
         param_start_index = docs.find(param_name, index)
         param_end_index = docs.find('--', param_start_index + 1)
         return docs[param_start_index:param_end_index]
+
+    def _prefetch(self, dot_cmd):
+        if self._prefetcher is None:
+            return
+        # e.g. 'aws.ec2' for 'aws.ec2.run-instances'.
+        parts = dot_cmd.split('.')
+        if len(parts) >= 2:
+            self._prefetcher.prefetch('.'.join(parts[:2]))
+
+
+class DocCache(object):
+    """A thread safe LRU cache of docs, bounded by their size in bytes.
+
+    Empty docs aren't cached, the doc index may still be written.
+
+    """
+    def __init__(self, max_size):
+        self._docs = LRUCache(max_size, get_size=sys.getsizeof)
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return self._docs.max_size
+
+    @property
+    def size(self):
+        return self._docs.size
+
+    def get(self, key):
+        """Return the docs for ``key``, or ``None`` if they're not cached."""
+        with self._lock:
+            return self._docs.get(key)
+
+    def put(self, key, docs):
+        if not docs:
+            return
+        with self._lock:
+            self._docs.put(key, docs)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._docs
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+
+class _Prefetcher(object):
+    # Loads the descriptions of every command of a service into a
+    # DocCache, in a daemon thread.  sqlite connections can't be shared
+    # between threads, so the thread opens its own connection.
+    def __init__(self, open_doc_index, cache):
+        self._open_doc_index = open_doc_index
+        self._cache = cache
+        self._last_service = None
+        # Only the last service requested is prefetched, the
+        # user has already moved on from the others.
+        self._requested = None
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._thread = None
+
+    def prefetch(self, service):
+        if service == self._last_service:
+            return
+        self._last_service = service
+        with self._lock:
+            self._requested = service
+        self._event.set()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        try:
+            doc_index = self._open_doc_index()
+        except sqlite3.Error:
+            LOG.debug("Unable to open the doc index to prefetch docs.",
+                      exc_info=True)
+            return
+        while True:
+            self._event.wait()
+            with self._lock:
+                service = self._requested
+                self._event.clear()
+            self._prefetch_service(doc_index, service)
+
+    def _prefetch_service(self, doc_index, service):
+        try:
+            items = doc_index.items(
+                service + '.', suffix=section_key('', 'description'))
+        except sqlite3.Error:
+            LOG.debug("Unable to prefetch the docs of %s", service,
+                      exc_info=True)
+            return
+        LOG.debug("Prefetched %s descriptions for %s", len(items), service)
+        for key, docs in items:
+            # Don't make the docs the user is looking at
+            # less recently used than the prefetched docs.
+            if key not in self._cache:
+                self._cache.put(key, docs)
+
+
+def _decode(dot_cmd):
+    if isinstance(dot_cmd, bytes):
+        dot_cmd = dot_cmd.decode('utf-8')
+    return dot_cmd
@@ -40,11 +40,50 @@ for the word to be a match.
 
 """
 from __future__ import print_function
+import heapq
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-def fuzzy_search(user_input, corpus):
+
+# When numpy is installed, fuzzy_search() scores corpora with at
+# least this many words with a VectorizedCorpus.  Below this, the
+# cost of encoding the words outweighs scoring them one at a time.
+VECTORIZE_THRESHOLD = 500
+
+
+def fuzzy_search(user_input, corpus, limit=None):
+    """Return the words in the corpus that match, best match first.
+
+    :type user_input: str
+    :param user_input: The search string.
+
+    :type corpus: list or FuzzyCorpus
+    :param corpus: The words to search.  If you're going to search the
+        same words more than once, use a :class:`FuzzyCorpus` so words
+        that can't possibly match are skipped without being scanned.
+
+    :type limit: int
+    :param limit: Only return the ``limit`` best matches.  When only a
+        handful of matches can be displayed, this is cheaper than
+        finding and sorting every match because we only keep the best
+        matches seen so far, and any word that can't beat the worst of
+        those is rejected as soon as its score falls below it.
+
+    :rtype: list
+    :return: The matching words, in the same order you'd get by
+        sorting on the score.  Ties are kept in corpus order.
+
+    """
+    if isinstance(corpus, VectorizedCorpus) or (
+            numpy is not None and len(corpus) >= VECTORIZE_THRESHOLD):
+        return _vectorized_corpus(corpus).search(user_input, limit)
+    if limit is not None:
+        return _best_matches(user_input, corpus, limit)
     candidates = []
-    for word in corpus:
+    for word in _possible_matches(user_input, corpus):
         current_score = calculate_score(user_input, word)
         if current_score > 0:
             candidates.append((word, current_score))
@@ -57,28 +96,264 @@ def calculate_score(search_string, word):
     # of what we're trying to do.
     # * If the search string is larger than the word, we know
     #   immediately that this can't be a match.
-    if len(search_string) > len(word):
+    if not search_string or len(search_string) > len(word):
+        return 0
+    match = _extend_match(search_string, word, 1, 0)
+    if match is None:
         return 0
-    original_word = word
-    score = 1
-    search_index = 0
-    while True:
-        scale = 1.0
-        search_char = search_string[search_index]
-        i = word.find(search_char)
+    score, position = match
+    # The more characters that matched the word, the better
+    # so prefer more complete matches.
+    return score * _completion_scale(word, position)
+
+
+class FuzzyCorpus(object):
+    """A list of words prepared for fuzzy searching.
+
+    For every word we precompute a bitmask of the characters it
+    contains.  A word can only match if it contains every character
+    in the search string, so comparing the masks rejects most words
+    without scanning them.
+
+    """
+    def __init__(self, words):
+        self.words = tuple(words)
+        self.masks = tuple(_char_mask(word) for word in self.words)
+        self._vectorized = None
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def possible_matches(self, search_string):
+        search_mask = _char_mask(search_string)
+        search_length = len(search_string)
+        for word, mask in zip(self.words, self.masks):
+            if search_mask & mask == search_mask and \
+                    search_length <= len(word):
+                yield word
+
+    def vectorized(self):
+        """Return a VectorizedCorpus of the words, built on first use."""
+        if self._vectorized is None:
+            self._vectorized = VectorizedCorpus(self.words)
+        return self._vectorized
+
+
+def _char_mask(text):
+    # One bit per ASCII character, every other character shares
+    # the last bit.  Sharing a bit only means we can't reject some
+    # words up front, we never reject a word that could match.
+    mask = 0
+    for char in text:
+        mask |= 1 << min(ord(char), 127)
+    return mask
+
+
+def _possible_matches(search_string, corpus):
+    if isinstance(corpus, FuzzyCorpus):
+        return corpus.possible_matches(search_string)
+    return corpus
+
+
+class VectorizedCorpus(object):
+    """A list of words that are scored all at once with numpy.
+
+    The words are encoded once into a 2D array of code points, one
+    row per word padded with zeros.  A search then matches each
+    character of the search string against every remaining word with
+    array operations instead of calling calculate_score() per word.
+    Words are dropped from the arrays as soon as a character doesn't
+    match, so each character only scans the words that could still
+    match.
+
+    This computes the scores with the same floating point operations
+    as calculate_score(), so the results are identical to
+    ``fuzzy_search(user_input, words)``.
+
+    This requires numpy.
+
+    """
+    def __init__(self, words):
+        self.words = tuple(words)
+        self.lengths = numpy.array([len(word) for word in self.words],
+                                   dtype=numpy.intp)
+        if not self.words:
+            self.codes = numpy.zeros((0, 0), dtype=numpy.uint32)
+        else:
+            self.codes = numpy.array(
+                self.words, dtype='U').view(
+                    numpy.uint32).reshape(len(self.words), -1)
+        self._columns = numpy.arange(self.codes.shape[1])
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def search(self, user_input, limit=None):
+        if not user_input:
+            return []
+        rows = numpy.flatnonzero(self.lengths >= len(user_input))
+        score = numpy.ones(len(rows))
+        position = numpy.zeros(len(rows), dtype=numpy.intp)
+        for search_char in user_input:
+            if not len(rows):
+                return []
+            # The same steps as _extend_match(), for every row at once.
+            codes = self.codes[rows]
+            hits = codes == ord(search_char)
+            hits &= self._columns >= position[:, None]
+            if search_char == u'\x00':
+                # Every row is padded with zeros, which aren't
+                # part of the word.
+                hits &= self._columns < self.lengths[rows, None]
+            found = hits.any(axis=1)
+            i = hits.argmax(axis=1)[found]
+            codes = codes[found]
+            rows = rows[found]
+            score = score[found]
+            position = position[found]
+            length = self.lengths[rows]
+            on_boundary = (i > position) & (
+                codes[numpy.arange(len(rows)), i - 1] == ord('-'))
+            scale = numpy.where(
+                on_boundary, 0.95,
+                1 - numpy.true_divide(i - position, length - position))
+            score *= scale
+            position = i + 1
+        length = self.lengths[rows]
+        score *= 1 - numpy.true_divide(length - position, length)
+        # A stable sort keeps ties in corpus order.
+        ranked = rows[numpy.argsort(-score, kind='mergesort')]
+        if limit is not None:
+            ranked = ranked[:max(limit, 0)]
+        return [self.words[row] for row in ranked]
+
+
+def _vectorized_corpus(corpus):
+    if isinstance(corpus, VectorizedCorpus):
+        return corpus
+    elif isinstance(corpus, FuzzyCorpus):
+        return corpus.vectorized()
+    return VectorizedCorpus(corpus)
+
+
+class FuzzySession(object):
+    """Fuzzy search a corpus as the user types.
+
+    Typing another character can only narrow down the matches, so
+    instead of scoring the entire corpus on every keystroke we keep
+    track of the words that matched the previous search string along
+    with how far into each word we matched.  If the new search string
+    extends the previous one, only those words are rescanned, and
+    only for the new characters.  Anything else (e.g. the user
+    deleting a character) falls back to a full scan of the corpus.
+
+    A session is tied to a single corpus, so create a new session
+    whenever the completion context changes.
+
+    The results are the same as ``fuzzy_search(user_input, corpus)``.
+
+    """
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self._search_string = None
+        # A list of (word, score, position) for every word that
+        # matched self._search_string, in corpus order.  The score
+        # does not include the completion scale, and position is the
+        # index in the word after the last matched character.
+        self._matches = []
+
+    def search(self, user_input, limit=None):
+        if not user_input:
+            self._search_string = None
+            self._matches = []
+            return []
+        previous = self._search_string
+        if previous and user_input.startswith(previous):
+            new_chars = user_input[len(previous):]
+            candidates = self._matches
+        else:
+            new_chars = user_input
+            candidates = [
+                (word, 1, 0) for word in
+                _possible_matches(user_input, self.corpus)
+                if len(user_input) <= len(word)]
+        matches = []
+        for word, score, position in candidates:
+            match = _extend_match(new_chars, word, score, position)
+            if match is not None:
+                matches.append((word, match[0], match[1]))
+        self._search_string = user_input
+        self._matches = matches
+        return self._ranked_results(limit)
+
+    def _ranked_results(self, limit):
+        scored = []
+        for word, score, position in self._matches:
+            scored.append((word, score * _completion_scale(word, position)))
+        if limit is not None:
+            ranked = heapq.nlargest(limit, scored, key=lambda x: x[1])
+        else:
+            ranked = sorted(scored, key=lambda x: x[1], reverse=True)
+        return [c[0] for c in ranked]
+
+
+def _best_matches(user_input, corpus, limit):
+    # A min heap of (score, -index, word) for the best matches
+    # seen so far.  The worst of them is at heap[0], and including
+    # the index means that on a tie the later word is the worse match.
+    if limit <= 0 or not user_input:
+        return []
+    best = []
+    threshold = 0
+    for index, word in enumerate(_possible_matches(user_input, corpus)):
+        if len(user_input) > len(word):
+            continue
+        match = _extend_match(user_input, word, 1, 0, threshold)
+        if match is None:
+            continue
+        score = match[0] * _completion_scale(word, match[1])
+        if score <= threshold:
+            continue
+        if len(best) < limit:
+            heapq.heappush(best, (score, -index, word))
+            if len(best) == limit:
+                threshold = best[0][0]
+        else:
+            heapq.heapreplace(best, (score, -index, word))
+            threshold = best[0][0]
+    return [c[2] for c in sorted(best, reverse=True)]
+
+
+def _extend_match(search_chars, word, score, position, threshold=0):
+    # Match each of search_chars in word, starting at position.
+    # This computes the same score as calculate_score(), but works
+    # off of indices into the original word so we can pick up where
+    # a previous search left off.  Returns a tuple of the new
+    # (score, position), or None if the word doesn't match.
+    #
+    # Every character can only lower the score, so we also give up
+    # as soon as the score is no better than the threshold.
+    length = len(word)
+    for search_char in search_chars:
+        i = word.find(search_char, position)
         if i < 0:
-            return 0
-        if i > 0 and word[i - 1] == '-':
+            return None
+        if i > position and word[i - 1] == '-':
             scale = 0.95
         else:
-            scale = 1 - (i / float(len(word)))
+            scale = 1 - ((i - position) / float(length - position))
         score *= scale
-        word = word[i + 1:]
-        search_index += 1
-        if search_index >= len(search_string):
-            break
-    # The more characters that matched the word, the better
-    # so prefer more complete matches.
-    completion_scale = 1 - (len(word) / float(len(original_word)))
-    score *= completion_scale
-    return score
+        if score <= threshold:
+            return None
+        position = i + 1
+    return score, position
+
+
+def _completion_scale(word, position):
+    return 1 - ((len(word) - position) / float(len(word)))
@@ -0,0 +1,329 @@
+"""Compact binary format for the completion index.
+
+Loading the JSON completion index means parsing every service up
+front, even though a session typically only uses a handful of them.
+This module stores the same data in a binary format that loads in a
+fraction of the time.  The file consists of:
+
+* A header with a magic string, the format version, the version of
+  the marshal format used to encode the records, and the offset,
+  length and CRC32 checksum of the root record.
+* A record for every service, encoded with marshal.
+* A record for the root ``aws`` node.  Instead of the services
+  themselves, it contains the offset, length and CRC32 checksum of
+  each service's record, along with the names of every operation and
+  argument in the index (see :class:`awsshell.index.records.Lexicon`),
+  so syntax highlighting doesn't need to load every service.
+
+Each record starts with a table of the unique strings and a table of
+the unique argument metadata in that record.  The rest of the record
+refers to these by their position in the tables, so the many arguments
+that are repeated across operations (``--dry-run``, ``--cli-input-json``,
+etc.), along with their metadata, are only stored once per record.
+
+When the records are loaded, equal strings and equal argument
+metadata are shared across every record that's been decoded.  The
+argument metadata is loaded as immutable
+:class:`awsshell.index.records.ArgumentMetadata` instances, so a
+single instance can be shared by every argument that has the same
+metadata.
+
+Loading the index only decodes the root record.  Each service is
+decoded the first time it's looked up, after its checksum is
+checked, so the cost of loading the index, in both time and memory,
+is proportional to the services that are used.  The records are read
+from the data with slices, so if the data is a memory mapped file
+only the pages of the services that are used are ever read from disk.
+A service whose checksum doesn't match is treated as missing from the
+index.
+
+The loaded index is made of :class:`awsshell.index.records.IndexNode`
+instances, which have the same structure as the JSON index, so the
+JSON format can still be used as a fallback or for debugging.
+
+"""
+import zlib
+import logging
+import marshal
+import struct
+
+from awsshell.compat import Mapping
+from awsshell.index.records import ArgumentMetadata, IndexNode, Lexicon
+
+
+LOG = logging.getLogger(__name__)
+MAGIC = b'AWSSHIDX'
+FORMAT_VERSION = 5
+# Version 2 of the marshal format can be read by every
+# version of python we support.
+MARSHAL_VERSION = 2
+# magic, format version, marshal version, root offset, root length,
+# root checksum.
+HEADER = struct.Struct('>8sHHIII')
+# The argument metadata fields, in the order they're encoded.
+# Everything except 'required' is a string.
+METADATA_FIELDS = ArgumentMetadata.FIELDS
+
+
+class IndexFormatError(Exception):
+    """Raised when data is not a valid binary completion index."""
+
+
+def dumps(index_data):
+    """Encode a completion index in the binary format.
+
+    :type index_data: dict
+    :param index_data: The completion index, as generated
+        by ``awsshell.makeindex``.
+
+    :rtype: bytes
+    :raises: :class:`IndexFormatError` if the index can't be encoded.
+
+    """
+    root = index_data['aws']
+    chunks = []
+    offset = HEADER.size
+    services = []
+    for name, service in root['children'].items():
+        record = _dump_node(service)
+        services.append((name, offset, len(record), _checksum(record)))
+        chunks.append(record)
+        offset += len(record)
+    root_record = _dump_node(root, services=services,
+                             lexicon=Lexicon.from_index(root))
+    chunks.append(root_record)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, MARSHAL_VERSION,
+                         offset, len(root_record), _checksum(root_record))
+    return header + b''.join(chunks)
+
+
+def loads(data, on_corrupt=None):
+    """Load a completion index from the binary format.
+
+    :type data: bytes or mmap
+    :param data: The contents of a binary index file.  Only the
+        parts of the data that are needed are read, so a memory
+        mapped file should be used to avoid reading the whole file.
+        The data must not be closed while the index is in use.
+
+    :type on_corrupt: callable
+    :param on_corrupt: Called when a service's record is found to be
+        corrupt, the first time the service is looked up.  The service
+        is treated as missing from the index, so the caller should
+        replace the index.
+
+    :rtype: dict
+    :return: The completion index.  Each service in the ``children``
+        of the root node is decoded the first time it's accessed.
+        The ``lexicon`` key is the :class:`Lexicon` of the index.
+    :raises: :class:`IndexFormatError` if the data is not a valid
+        binary index, or was written with a different format version.
+
+    """
+    if len(data) < HEADER.size:
+        raise IndexFormatError("Binary index is truncated.")
+    (magic, format_version, marshal_version,
+     root_offset, root_length, root_checksum) = HEADER.unpack(
+         data[:HEADER.size])
+    if magic != MAGIC:
+        raise IndexFormatError("Not a binary completion index.")
+    if format_version != FORMAT_VERSION or \
+            marshal_version > marshal.version:
+        raise IndexFormatError(
+            "Unsupported binary index version: %s (marshal version %s)"
+            % (format_version, marshal_version))
+    if root_offset + root_length != len(data):
+        # The root record is always at the end of the data.
+        raise IndexFormatError("Binary index has the wrong length.")
+    shared = _SharedValues()
+    tables, record = _load_record(data, root_offset, root_length,
+                                  root_checksum, shared)
+    arguments, metadata, commands, services, lexicon = record
+    root = _decode_node((arguments, metadata, commands, ()), tables)
+    strings = tables[0]
+    root.children = LazyChildren(data, [
+        (strings[name_id], offset, length, checksum)
+        for name_id, offset, length, checksum in services], shared,
+        on_corrupt)
+    subcommands, args_opts = lexicon
+    lexicon = Lexicon(
+        commands=list(root.commands),
+        subcommands=[strings[i] for i in subcommands],
+        global_opts=list(root.arguments),
+        args_opts=set(strings[i] for i in args_opts))
+    return {'aws': root, 'lexicon': lexicon}
+
+
+class LazyChildren(Mapping):
+    """The children of the root node, decoded on first access.
+
+    A service whose record is corrupt is treated as missing.
+
+    """
+
+    def __init__(self, data, services, shared, on_corrupt=None):
+        self._data = data
+        self._shared = shared
+        self._on_corrupt = on_corrupt
+        # service name -> (offset, length, checksum)
+        self._locations = {}
+        self._names = []
+        for name, offset, length, checksum in services:
+            self._names.append(name)
+            self._locations[name] = (offset, length, checksum)
+        self._loaded = {}
+        self._corrupt = set()
+
+    def __getitem__(self, name):
+        try:
+            return self._loaded[name]
+        except KeyError:
+            pass
+        if name in self._corrupt:
+            raise KeyError(name)
+        offset, length, checksum = self._locations[name]
+        try:
+            tables, record = _load_record(
+                self._data, offset, length, checksum, self._shared)
+        except IndexFormatError:
+            LOG.debug("Binary index record for %s is corrupt.", name,
+                      exc_info=True)
+            self._corrupt.add(name)
+            if self._on_corrupt is not None:
+                self._on_corrupt()
+            raise KeyError(name)
+        node = _decode_node(record, tables)
+        self._loaded[name] = node
+        return node
+
+    def __iter__(self):
+        return (name for name in self._names if name not in self._corrupt)
+
+    def __len__(self):
+        return len(self._names) - len(self._corrupt)
+
+    def __contains__(self, name):
+        return name in self._locations and name not in self._corrupt
+
+
+class _Table(object):
+    # Assigns each unique value an id, its position in the table.
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def id(self, value):
+        try:
+            return self._ids[value]
+        except KeyError:
+            value_id = len(self.values)
+            self._ids[value] = value_id
+            self.values.append(value)
+            return value_id
+
+
+class _SharedValues(object):
+    # The strings and argument metadata of every record that's
+    # been decoded from an index, so that equal values are shared
+    # rather than duplicated across records.
+    def __init__(self):
+        self._strings = {}
+        self._metadata = {}
+
+    def strings(self, strings):
+        shared = self._strings
+        return [shared.setdefault(value, value) for value in strings]
+
+    def metadata(self, table, strings):
+        shared = self._metadata
+        records = []
+        for entry in table:
+            values = (entry[0],) + tuple(strings[i] for i in entry[1:])
+            record = shared.get(values)
+            if record is None:
+                record = ArgumentMetadata(*values)
+                shared[values] = record
+            records.append(record)
+        return records
+
+
+def _dump_node(node, services=None, lexicon=None):
+    # A record is the tuple (strings, metadata, node).  The metadata
+    # is a table of (required, type_name_id, ...) tuples, in the
+    # order of METADATA_FIELDS, see _encode_node() for the node.
+    # The root node's children are (name_id, offset, length, checksum)
+    # tuples of the services.  It also has the ids of the lexicon's
+    # (subcommands, args_opts) at the end of its tuple.
+    strings = _Table()
+    metadata = _Table()
+    if services is None:
+        record = _encode_node(node, strings, metadata)
+    else:
+        children = tuple((strings.id(name), offset, length, checksum)
+                         for name, offset, length, checksum in services)
+        record = _encode_node(node, strings, metadata, children=children)
+    if lexicon is not None:
+        record += ((
+            tuple(strings.id(name) for name in lexicon.subcommands),
+            tuple(strings.id(name) for name in sorted(lexicon.args_opts)),
+        ),)
+    return marshal.dumps(
+        (tuple(strings.values), tuple(metadata.values), record),
+        MARSHAL_VERSION)
+
+
+def _checksum(record):
+    return zlib.crc32(record) & 0xffffffff
+
+
+def _load_record(data, offset, length, checksum, shared):
+    # Returns the tuple ((strings, metadata), node).
+    record = data[offset:offset + length]
+    if _checksum(record) != checksum:
+        raise IndexFormatError("Binary index record checksum doesn't match.")
+    try:
+        strings, metadata, record = marshal.loads(record)
+        strings = shared.strings(strings)
+        metadata = shared.metadata(metadata, strings)
+    except (EOFError, ValueError, TypeError, IndexError) as e:
+        raise IndexFormatError("Invalid binary index record: %s" % e)
+    return (strings, metadata), record
+
+
+def _encode_node(node, strings, metadata, children=None):
+    # A node is encoded as the tuple:
+    # (arguments, argument_metadata, commands, children)
+    # where argument_metadata is a tuple of (name_id, metadata_id).
+    if children is None:
+        children = tuple(
+            (strings.id(name), _encode_node(child, strings, metadata))
+            for name, child in node['children'].items())
+    arguments = tuple(strings.id(arg) for arg in node['arguments'])
+    argument_metadata = tuple(
+        (strings.id(name), metadata.id(_encode_metadata(name, value, strings)))
+        for name, value in node['argument_metadata'].items())
+    commands = tuple(strings.id(command) for command in node['commands'])
+    return (arguments, argument_metadata, commands, children)
+
+
+def _encode_metadata(name, metadata, strings):
+    if sorted(metadata) != sorted(METADATA_FIELDS):
+        raise IndexFormatError(
+            "Unsupported argument metadata for %s: %s"
+            % (name, ', '.join(sorted(metadata))))
+    return (bool(metadata['required']),) + tuple(
+        strings.id(metadata[field]) for field in METADATA_FIELDS[1:])
+
+
+def _decode_node(record, tables):
+    strings, metadata = tables
+    arguments, argument_metadata, commands, children = record
+    return IndexNode(
+        arguments=[strings[i] for i in arguments],
+        argument_metadata=dict(
+            (strings[name_id], metadata[metadata_id])
+            for name_id, metadata_id in argument_metadata),
+        commands=[strings[i] for i in commands],
+        children=dict(
+            (strings[name], _decode_node(child, tables))
+            for name, child in children))
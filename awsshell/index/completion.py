@@ -10,15 +10,98 @@ a higher level overview.
 """
 import os
 import json
+import zlib
+import logging
 
-from awsshell.utils import FSLayer, FileReadError, build_config_file_path
+from awsshell.utils import FSLayer, FileReadError, FileWriteError
+from awsshell.utils import build_config_file_path
+from awsshell.index import binary
+from awsshell.index.records import IndexNode, Lexicon
 from awsshell import utils
 
 
+LOG = logging.getLogger(__name__)
+# The first line of a JSON completion index file is a header with:
+# the prefix, the format version, the CLI version of the index, and
+# the length and CRC32 checksum of the JSON that follows, see
+# dumps_index().
+INDEX_HEADER_PREFIX = 'aws-shell-index'
+INDEX_FORMAT_VERSION = 1
+
+
 class IndexLoadError(Exception):
     """Raised when an index could not be loaded."""
 
 
+class IndexValidationError(IndexLoadError):
+    """Raised when an index file is corrupt or for a different version."""
+
+
+def dumps_index(index_data, version_string):
+    """Serialize a completion index to the contents of an index file.
+
+    :type index_data: dict
+    :param index_data: The completion index.
+
+    :type version_string: str
+    :param version_string: The AWS CLI version of the index.
+
+    :rtype: str
+    :return: The header line followed by the JSON index.
+
+    """
+    body = json.dumps(index_data)
+    header = '%s %s %s %s %08x\n' % (
+        INDEX_HEADER_PREFIX, INDEX_FORMAT_VERSION, version_string,
+        len(body), _checksum(body))
+    return header + body
+
+
+def validate_index(contents, version_string=None):
+    """Validate the contents of an index file and return the JSON index.
+
+    This checks the header written by :func:`dumps_index` against the
+    rest of the contents.  It's much cheaper than parsing the JSON, and
+    catches an index that was truncated or corrupted on disk before
+    we try to use it.
+
+    :type contents: str
+    :param contents: The contents of an index file.
+
+    :type version_string: str
+    :param version_string: The AWS CLI version the index should be for.
+        If not provided, the index can be for any version.
+
+    :rtype: str
+    :return: The JSON index, without the header.
+
+    :raises: :class:`IndexValidationError` if the index is invalid.
+
+    """
+    header, _, body = contents.partition('\n')
+    parts = header.split(' ')
+    if len(parts) != 5 or parts[0] != INDEX_HEADER_PREFIX:
+        raise IndexValidationError("Index file has no header.")
+    _, format_version, index_version, length, checksum = parts
+    if format_version != str(INDEX_FORMAT_VERSION):
+        raise IndexValidationError(
+            "Unsupported index format version: %s" % format_version)
+    if version_string is not None and index_version != version_string:
+        raise IndexValidationError(
+            "Index is for CLI version %s, expected %s"
+            % (index_version, version_string))
+    if length != str(len(body)):
+        raise IndexValidationError(
+            "Index is %s characters, expected %s" % (len(body), length))
+    if checksum != '%08x' % _checksum(body):
+        raise IndexValidationError("Index checksum doesn't match.")
+    return body
+
+
+def _checksum(body):
+    return zlib.crc32(body.encode('utf-8')) & 0xffffffff
+
+
 class CompletionIndex(object):
     """Handles working with the local commmand completion index.
 
@@ -40,11 +123,17 @@ class CompletionIndex(object):
     # every time the CLI starts up.
     DEFAULT_CACHE_DIR = build_config_file_path('cache')
 
-    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, fslayer=None):
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, fslayer=None,
+                 search_dirs=None):
         self._cache_dir = cache_dir
         if fslayer is None:
             fslayer = FSLayer()
         self._fslayer = fslayer
+        # Read only directories with indices shared by every user,
+        # they're searched before the cache dir.
+        if search_dirs is None:
+            search_dirs = utils.shared_index_dirs()
+        self._search_dirs = search_dirs
         self.commands = []
         self.subcommands = []
         self.global_opts = []
@@ -53,50 +142,219 @@ class CompletionIndex(object):
     def load_index(self, version_string):
         """Load the completion index for a given CLI version.
 
+        The shared index directories are searched first, then the
+        cache dir.
+
         :type version_string: str
         :param version_string: The AWS CLI version, e.g "1.9.2".
 
-        :raises: :class:`IndexLoadError <exceptions.IndexLoadError>`
+        :rtype: str
+        :return: The JSON completion index, after its header has been
+            validated (see :func:`validate_index`).
+
+        :raises: :class:`IndexLoadError <exceptions.IndexLoadError>`,
+            or :class:`IndexValidationError` if the index file in the
+            cache dir is invalid, in which case it should be generated
+            again.
         """
-        filename = self._filename_for_version(version_string)
+        for dirname in self._search_dirs:
+            try:
+                return self._load_json_index(dirname, version_string)
+            except IndexLoadError:
+                LOG.debug("No shared completion index in %s", dirname,
+                          exc_info=True)
+        return self._load_json_index(self._cache_dir, version_string)
+
+    def _load_json_index(self, dirname, version_string):
+        filename = self._filename_for_version(version_string, dirname)
         try:
             contents = self._fslayer.file_contents(filename)
         except FileReadError as e:
             raise IndexLoadError(str(e))
-        return contents
+        try:
+            return validate_index(contents, version_string)
+        except IndexValidationError as e:
+            raise IndexValidationError("%s: %s" % (filename, e))
+
+    def load_index_data(self, version_string):
+        """Load and parse the completion index for a given CLI version.
+
+        The binary index is used if it's available, it loads much
+        faster than the JSON index.  Otherwise the JSON index is
+        parsed and a binary index is written for next time.
+
+        The binary index is memory mapped and each service is only
+        read from the file the first time it's used, so the file
+        stays open for as long as the index is in use.
+
+        The shared index directories are searched first.  They're
+        read only, so a binary index is never written to them.  The
+        cache dir is only used when none of them have a valid index
+        for ``version_string``.
 
-    def _filename_for_version(self, version_string):
+        :type version_string: str
+        :param version_string: The AWS CLI version, e.g "1.9.2".
+
+        :rtype: dict
+        :return: The parsed completion index.  The ``aws`` key is the
+            root :class:`awsshell.index.records.IndexNode`, and the
+            ``lexicon`` key is the index's
+            :class:`awsshell.index.records.Lexicon`.
+
+        :raises: :class:`IndexLoadError <exceptions.IndexLoadError>`
+        """
+        for dirname in self._search_dirs:
+            try:
+                return self._load_index_data(
+                    dirname, version_string, write_binary=False)
+            except IndexLoadError:
+                LOG.debug("No shared completion index in %s", dirname,
+                          exc_info=True)
+        return self._load_index_data(
+            self._cache_dir, version_string, write_binary=True)
+
+    def _load_index_data(self, dirname, version_string, write_binary):
+        binary_filename = self._binary_filename_for_version(
+            version_string, dirname)
+        if self._fslayer.file_exists(binary_filename):
+            LOG.debug("Loading binary completion index: %s", binary_filename)
+            try:
+                return self._load_binary_index(
+                    binary_filename, remove_if_corrupt=write_binary)
+            except (FileReadError, binary.IndexFormatError):
+                LOG.debug("Unable to load binary index %s, falling back "
+                          "to the JSON index.", binary_filename,
+                          exc_info=True)
+        LOG.debug("Loading JSON completion index: %s",
+                  self._filename_for_version(version_string, dirname))
+        index_data = json.loads(
+            self._load_json_index(dirname, version_string))
+        if write_binary:
+            self.write_binary_index(index_data, version_string)
+        index_data['aws'] = IndexNode.from_dict(index_data['aws'])
+        index_data['lexicon'] = Lexicon.from_index(index_data['aws'])
+        return index_data
+
+    def _load_binary_index(self, filename, remove_if_corrupt=False):
+        contents = self._fslayer.map_file(filename)
+        on_corrupt = None
+        if remove_if_corrupt:
+            # The service is missing from the index for this session,
+            # the binary index is written again on the next run.
+            on_corrupt = lambda: self._remove_binary_index(filename)
+        try:
+            return binary.loads(contents, on_corrupt=on_corrupt)
+        except binary.IndexFormatError:
+            # Don't keep the file open, we're about to replace it.
+            close = getattr(contents, 'close', None)
+            if close is not None:
+                close()
+            raise
+
+    def _remove_binary_index(self, filename):
+        LOG.debug("Removing corrupt binary index %s", filename)
+        try:
+            self._fslayer.remove_file(filename)
+        except FileWriteError:
+            # e.g. Windows can't remove a file that's memory mapped.
+            LOG.debug("Unable to remove binary index %s", filename,
+                      exc_info=True)
+
+    def write_binary_index(self, index_data, version_string):
+        """Write the binary completion index for a given CLI version.
+
+        Writing the binary index is only an optimization, so
+        errors are logged rather than raised.
+
+        """
+        filename = self._binary_filename_for_version(version_string)
+        try:
+            self._fslayer.write_file_contents(
+                filename, binary.dumps(index_data), binary=True)
+        except (FileWriteError, binary.IndexFormatError):
+            LOG.debug("Unable to write binary index %s", filename,
+                      exc_info=True)
+
+    def load_previous_index_data(self, version_string):
+        """Load the JSON completion index of the newest other CLI version.
+
+        The cache dir is searched first, then the shared index
+        directories.  Only an index that has the fingerprints of its
+        services is returned, so that the services that didn't change
+        can be reused (see :func:`awsshell.makeindex.build_index`).
+
+        :type version_string: str
+        :param version_string: The current AWS CLI version, e.g "1.9.2".
+
+        :rtype: dict
+        :return: The parsed JSON completion index, or ``None`` if there
+            isn't one.
+
+        """
+        for dirname in [self._cache_dir] + list(self._search_dirs):
+            filenames = utils.other_versions(
+                self._fslayer.list_files(dirname),
+                'completions-%s.json', version_string)
+            for filename in filenames:
+                index_data = self._load_previous_index_data(
+                    os.path.join(dirname, filename))
+                if index_data is not None:
+                    return index_data
+        return None
+
+    def _load_previous_index_data(self, filename):
+        try:
+            index_data = json.loads(
+                validate_index(self._fslayer.file_contents(filename)))
+        except (FileReadError, IndexValidationError, ValueError):
+            LOG.debug("Unable to load previous index %s", filename,
+                      exc_info=True)
+            return None
+        if 'fingerprints' not in index_data:
+            return None
+        LOG.debug("Loaded previous completion index: %s", filename)
+        return index_data
+
+    def _filename_for_version(self, version_string, dirname=None):
+        if dirname is None:
+            dirname = self._cache_dir
         return os.path.join(
-            self._cache_dir, 'completions-%s.json' % version_string)
+            dirname, 'completions-%s.json' % version_string)
 
-    def load_completions(self):
+    def _binary_filename_for_version(self, version_string, dirname=None):
+        if dirname is None:
+            dirname = self._cache_dir
+        return os.path.join(
+            dirname, 'completions-%s.bin' % version_string)
+
+    def load_completions(self, index_data=None):
         """Load completions from the completion index.
 
+        :type index_data: dict
+        :param index_data: The parsed completion index, e.g. from
+            :meth:`load_index_data`.  If not provided, the index for
+            the installed CLI version is read and parsed.
+
         Updates the following attributes:
             * commands
             * subcommands
             * global_opts
             * args_opts
         """
-        try:
-            index_str = self.load_index(utils.AWSCLI_VERSION)
-        except IndexLoadError:
-            return
-        index_str = self.load_index(utils.AWSCLI_VERSION)
-        index_data = json.loads(index_str)
-        index_root = index_data['aws']
+        if index_data is None:
+            try:
+                index_str = self.load_index(utils.AWSCLI_VERSION)
+            except IndexLoadError:
+                return
+            index_data = json.loads(index_str)
+        lexicon = index_data.get('lexicon')
+        if lexicon is None:
+            lexicon = Lexicon.from_index(index_data['aws'])
         # ec2, s3, elb...
-        self.commands = index_root['commands']
+        self.commands = lexicon.commands
+        # start-instances, stop-instances, terminate-instances...
+        self.subcommands = lexicon.subcommands
         # --profile, --region, --output...
-        self.global_opts = index_root['arguments']
-        for command in self.commands:
-            # ec2: start-instances, stop-instances, terminate-instances...
-            subcommands_current = index_root['children'] \
-                .get(command)['commands']
-            self.subcommands.extend(subcommands_current)
-            for subcommand_current in subcommands_current:
-                # start-instances: --instance-ids, --dry-run...
-                args_opts_current = index_root['children'] \
-                    .get(command)['children'] \
-                    .get(subcommand_current)['arguments']
-                self.args_opts.update(args_opts_current)
+        self.global_opts = lexicon.global_opts
+        # --instance-ids, --dry-run...
+        self.args_opts = lexicon.args_opts
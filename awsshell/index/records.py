@@ -0,0 +1,143 @@
+"""Records for the data in the completion index.
+
+These are the values returned when loading the completion index
+(see :mod:`awsshell.index.completion`).  They use ``__slots__``, so
+they take up less memory than the dicts in the JSON completion index
+and their values are accessed as attributes.
+
+They also support the same lookups as the dicts in the JSON completion
+index, e.g. ``node['commands']``, and compare equal to the equivalent
+dicts, so code that still works with dicts keeps working.  Use
+``IndexNode.from_dict()`` to convert an index made of dicts.
+
+"""
+from collections import namedtuple
+
+from awsshell.compat import Mapping
+
+
+class ArgumentMetadata(Mapping):
+    """The metadata for a single argument of a command.
+
+    Values can be accessed as attributes, e.g. ``metadata.required``,
+    or as keys, e.g. ``metadata['required']``.  Instances can't be
+    modified, so a single instance is shared by every argument with
+    the same metadata.
+
+    """
+    __slots__ = FIELDS = ('required', 'type_name', 'minidoc',
+                          'example', 'api_name')
+
+    def __init__(self, required, type_name, minidoc, example, api_name):
+        set_value = super(ArgumentMetadata, self).__setattr__
+        set_value('required', required)
+        set_value('type_name', type_name)
+        set_value('minidoc', minidoc)
+        set_value('example', example)
+        set_value('api_name', api_name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ArgumentMetadata is immutable.")
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return 'ArgumentMetadata(%s)' % ', '.join(
+            '%s=%r' % (field, getattr(self, field)) for field in self.FIELDS)
+
+
+class IndexNode(Mapping):
+    """A command in the completion index.
+
+    :ivar arguments: The names of the command's arguments,
+        e.g. ``['--instance-ids', '--dry-run']``.
+    :ivar argument_metadata: A mapping of argument name to the
+        metadata for that argument.
+    :ivar commands: The names of the command's subcommands.
+    :ivar children: A mapping of subcommand name to the
+        :class:`IndexNode` for that subcommand.
+
+    """
+    __slots__ = FIELDS = ('arguments', 'argument_metadata',
+                          'commands', 'children')
+
+    def __init__(self, arguments, argument_metadata, commands, children):
+        self.arguments = arguments
+        self.argument_metadata = argument_metadata
+        self.commands = commands
+        self.children = children
+
+    @classmethod
+    def from_dict(cls, node):
+        """Convert a node from the JSON completion index.
+
+        The children of the node are converted as well.  Any
+        missing values default to being empty.  If ``node`` is
+        already an :class:`IndexNode` it's returned as is.
+
+        """
+        if isinstance(node, cls):
+            return node
+        return cls(
+            arguments=node.get('arguments', []),
+            argument_metadata=node.get('argument_metadata', {}),
+            commands=node.get('commands', []),
+            children=dict(
+                (name, cls.from_dict(child))
+                for name, child in node.get('children', {}).items()))
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return 'IndexNode(commands=%r, arguments=%r)' % (
+            self.commands, self.arguments)
+
+
+class Lexicon(namedtuple('Lexicon', ['commands', 'subcommands',
+                                     'global_opts', 'args_opts'])):
+    """Every name in the completion index, used for syntax highlighting.
+
+    :ivar commands: The services, e.g. ``['ec2', 's3', ...]``.
+    :ivar subcommands: The operations of every service,
+        e.g. ``['start-instances', 'stop-instances', ...]``.
+    :ivar global_opts: The global options, e.g. ``['--profile', ...]``.
+    :ivar args_opts: The set of arguments of every operation,
+        e.g. ``set(['--instance-ids', '--dry-run', ...])``.
+
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_index(cls, root):
+        """Collect the names from the root node of the completion index.
+
+        This has to visit every service in the index.
+
+        """
+        subcommands = []
+        args_opts = set()
+        for command in root['commands']:
+            service = root['children'][command]
+            subcommands.extend(service['commands'])
+            for subcommand in service['commands']:
+                args_opts.update(service['children'][subcommand]['arguments'])
+        return cls(commands=list(root['commands']), subcommands=subcommands,
+                   global_opts=list(root['arguments']), args_opts=args_opts)
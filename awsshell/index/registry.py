@@ -0,0 +1,72 @@
+"""A single, shared instance of the completion index.
+
+The completion index is used by the model completer, the lexer used
+for syntax highlighting, and anything else that needs to know about
+the available commands.  Rather than having each of them read and
+parse the index, they get it from an :class:`IndexRegistry`, which
+loads the index the first time it's requested and hands out the same
+object from then on.
+
+Usage
+=====
+
+.. code-block:: python
+
+  from awsshell.index import registry
+
+  # Loads the index for the installed CLI version on first use.
+  index_data = registry.DEFAULT_REGISTRY.get_index()
+
+"""
+import threading
+
+from awsshell.index.completion import CompletionIndex
+from awsshell import utils
+
+
+class IndexRegistry(object):
+    """Loads the completion index once and shares it.
+
+    :type completion_index: :class:`CompletionIndex`
+    :param completion_index: Used to load the index.
+
+    :type version_string: str
+    :param version_string: The AWS CLI version of the index to load.
+        Defaults to the installed CLI version.
+
+    """
+    def __init__(self, completion_index=None, version_string=None):
+        if completion_index is None:
+            completion_index = CompletionIndex()
+        if version_string is None:
+            version_string = utils.AWSCLI_VERSION
+        self.completion_index = completion_index
+        self.version_string = version_string
+        self._index_data = None
+        self._lock = threading.Lock()
+
+    def get_index(self):
+        """Return the completion index, loading it if needed.
+
+        :rtype: dict
+        :return: The completion index, see
+            :meth:`CompletionIndex.load_index_data`.
+
+        :raises: :class:`IndexLoadError <exceptions.IndexLoadError>` if
+            the index doesn't exist.  Nothing is cached in that case, so
+            once the index is generated ``get_index()`` can be called
+            again.
+        """
+        with self._lock:
+            if self._index_data is None:
+                self._index_data = self.completion_index.load_index_data(
+                    self.version_string)
+            return self._index_data
+
+    def set_index(self, index_data):
+        """Replace the index that's handed out from now on."""
+        with self._lock:
+            self._index_data = index_data
+
+
+DEFAULT_REGISTRY = IndexRegistry()
@@ -14,7 +14,20 @@ from pygments.lexer import RegexLexer
 from pygments.lexer import words
 from pygments.token import Keyword, Literal, Name, Operator, Text
 
-from awsshell.index.completion import CompletionIndex
+from awsshell.index.completion import CompletionIndex, IndexLoadError
+from awsshell.index import registry
+
+
+def load_completions(index_registry=registry.DEFAULT_REGISTRY):
+    """Load the completions to highlight from the shared index."""
+    completion_index = CompletionIndex()
+    try:
+        index_data = index_registry.get_index()
+    except IndexLoadError:
+        # Nothing is highlighted if there's no index.
+        return completion_index
+    completion_index.load_completions(index_data)
+    return completion_index
 
 
 class ShellLexer(RegexLexer):
@@ -28,8 +41,7 @@ class ShellLexer(RegexLexer):
     :param tokens: A dict of (`pygments.lexer`, `pygments.token`) used for
         pygments highlighting.
     """
-    completion_index = CompletionIndex()
-    completion_index.load_completions()
+    completion_index = load_completions()
     tokens = {
         'root': [
             # ec2, s3, elb...
@@ -1,20 +1,64 @@
 """Module for building the autocompletion indices."""
 from __future__ import print_function
 import os
+import re
+import sys
 import json
+import argparse
+import hashlib
+import signal
+import logging
+import tempfile
+import threading
+import subprocess
+import multiprocessing
 
 from six import BytesIO
+import docutils
 from docutils.core import publish_string
+import botocore.model
+import botocore.docs
+import botocore.exceptions
 from botocore.docs.bcdoc import textwriter
+import awscli
 import awscli.clidriver
 from awscli.argprocess import ParamShorthandDocGen
 
 from awsshell import determine_doc_index_filename
-from awsshell.utils import remove_html
+from awsshell import find_previous_doc_index_filename
+from awsshell import compat
+from awsshell.compat import replace_file
+from awsshell.utils import remove_html, FSLayer
+from awsshell.index import completion
+from awsshell.index.records import IndexNode, Lexicon
+from awsshell import utils
 from awsshell import docs
 
 
+LOG = logging.getLogger(__name__)
 SHORTHAND_DOC = ParamShorthandDocGen()
+# The botocore data the CLI commands of a service are generated from.
+MODEL_TYPES = ['service-2', 'paginators-1', 'waiters-2']
+# The doc index has a key with this prefix for every service whose
+# docs have all been written, see do_write_doc_index().
+DOCS_DONE_PREFIX = '__done__.'
+# The titles of the sections in the rendered docs of an operation,
+# see split_doc_sections().
+DOC_SECTION_TITLES = re.compile(r'^(SYNOPSIS|OPTIONS|EXAMPLES|OUTPUT)$',
+                                re.MULTILINE)
+# The start of the docs of an option, e.g. '--instance-ids (list)' or
+# '--dry-run | --no-dry-run (boolean)'.  Option names that are
+# mentioned in the docs never start a paragraph like this.  Long
+# names can be wrapped after a hyphen.
+OPTION_DOCS_START = re.compile(
+    r'(?:\A|(?<=\n\n))(--[\w-]+(?:\n[\w-]+)?)'
+    r'(?: \| (--[\w-]+(?:\n[\w-]+)?))?\s\(')
+GLOBAL_PARAMETERS_NOTE = "See 'aws help' for descriptions of global " \
+    "parameters."
+
+
+class IndexBuildError(Exception):
+    """Raised when the services couldn't be indexed."""
 
 
 def new_index():
@@ -23,6 +67,18 @@ def new_index():
 
 
 def index_command(index_dict, help_command):
+    _index_arguments(index_dict, help_command)
+    for cmd in help_command.command_table:
+        index_dict['commands'].append(cmd)
+        # Each sub command will trigger a recurse.
+        child = new_index()
+        index_dict['children'][cmd] = child
+        sub_command = help_command.command_table[cmd]
+        sub_help_command = sub_command.create_help_command()
+        index_command(child, sub_help_command)
+
+
+def _index_arguments(index_dict, help_command):
     arg_table = help_command.arg_table
     for arg in arg_table:
         arg_obj = arg_table[arg]
@@ -49,49 +105,563 @@ def index_command(index_dict, help_command):
 
         index_dict['arguments'].append('--%s' % arg)
         index_dict['argument_metadata']['--%s' % arg] = metadata
-    for cmd in help_command.command_table:
-        index_dict['commands'].append(cmd)
-        # Each sub command will trigger a recurse.
-        child = new_index()
-        index_dict['children'][cmd] = child
-        sub_command = help_command.command_table[cmd]
-        sub_help_command = sub_command.create_help_command()
-        index_command(child, sub_help_command)
 
 
-def write_index(output_filename=None):
+def build_index(processes=None, previous_index=None):
+    """Build the completion index for the installed AWS CLI.
+
+    Each service is indexed independently, so the services are
+    indexed in a pool of worker processes and the results are
+    merged back into the root of the index.  The index is identical
+    to the one built by calling ``index_command()`` on the CLI's
+    help command.
+
+    The index also records the fingerprint of every service (see
+    :func:`service_fingerprints`) under the ``fingerprints`` key.
+    When the CLI is upgraded, the services whose fingerprint didn't
+    change are copied from the previous version's index instead of
+    being indexed again.
+
+    :type processes: int
+    :param processes: The number of worker processes to use.
+        Defaults to the number of CPUs.  If this is 1, the index is
+        built in the current process.
+
+    :type previous_index: dict
+    :param previous_index: The completion index of another CLI
+        version, as written by :func:`write_index`.
+
+    :rtype: dict
+    :return: The completion index.
+
+    """
+    help_command = _create_help_command()
+    root = new_index()
+    _index_arguments(root, help_command)
+    fingerprints = service_fingerprints(help_command)
+    children = dict(iter_services(help_command, fingerprints,
+                                  processes, previous_index))
+    return _assemble_index(root, help_command, children, fingerprints)
+
+
+def iter_services(help_command, fingerprints, processes=None,
+                  previous_index=None):
+    """Index every service, yielding each one as it's indexed.
+
+    The services that are unchanged since ``previous_index`` come
+    first, then the services that had to be indexed, in the order
+    they finished.  See :func:`build_index` for the arguments.
+
+    :rtype: iterator
+    :return: An iterator of (service name, index) tuples.
+
+    """
+    copied = set()
+    for name, index in _iter_copied_services(previous_index, fingerprints):
+        copied.add(name)
+        yield name, index
+    changed = [name for name in help_command.command_table
+               if name not in copied]
+    LOG.debug("Indexing %s services, %s services are unchanged.",
+              len(changed), len(copied))
+    for result in _iter_indexed_services(help_command, changed, processes):
+        yield result
+
+
+def _iter_copied_services(previous_index, fingerprints):
+    # Yields (service name, index) for each service that can
+    # be copied from the previous index.
+    if previous_index is None:
+        return
+    for name in unchanged_services(
+            previous_index.get('fingerprints'), fingerprints):
+        index = previous_index['aws']['children'].get(name)
+        if index is not None:
+            yield name, index
+
+
+def _iter_indexed_services(help_command, names, processes=None):
+    # Yields (service name, index) for each service in ``names``.  The
+    # services are indexed in a pool if processes > 1, in which case
+    # they're yielded as they finish.
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(names) <= 1:
+        for name in names:
+            yield name, _index_subcommand(help_command, name)
+        return
+    pool = multiprocessing.Pool(min(processes, len(names)))
+    try:
+        for result in pool.imap_unordered(_index_service, names):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _assemble_index(root, help_command, children, fingerprints):
+    # Put the services into the root in the CLI's order.
+    for name in help_command.command_table:
+        root['commands'].append(name)
+        root['children'][name] = children[name]
+    return {'aws': root, 'fingerprints': fingerprints}
+
+
+# The CLI's help command in a worker process of build_index() or
+# do_write_doc_index(), created on the first service the worker indexes.
+_WORKER_HELP_COMMAND = None
+
+
+def _index_service(name):
+    return name, _index_subcommand(_worker_help_command(), name)
+
+
+def _worker_help_command():
+    global _WORKER_HELP_COMMAND
+    if _WORKER_HELP_COMMAND is None:
+        _WORKER_HELP_COMMAND = _create_help_command()
+    return _WORKER_HELP_COMMAND
+
+
+def _index_subcommand(help_command, name):
+    sub_command = help_command.command_table[name]
+    index = new_index()
+    index_command(index, sub_command.create_help_command())
+    return index
+
+
+def _create_help_command():
     driver = awscli.clidriver.create_clidriver()
-    help_command = driver.create_help_command()
-    index = {'aws': new_index()}
-    current = index['aws']
-    index_command(current, help_command)
+    return driver.create_help_command()
+
+
+def service_fingerprints(help_command):
+    """Fingerprint the inputs to the index of every top level command.
+
+    The fingerprint of a command is a hash of everything its
+    completion index and docs are generated from:
+
+    * The botocore models of the service (see ``MODEL_TYPES``).
+    * The CLI customizations and examples for the command, i.e. the
+      modules in ``awscli.customizations`` and the directory in
+      ``awscli/examples`` named after the command.
+    * The code shared by every command: the rest of the CLI along
+      with the botocore and aws-shell code that the index and docs
+      are generated with.
 
-    result = json.dumps(index)
-    if not os.path.isdir(os.path.dirname(output_filename)):
-        os.makedirs(os.path.dirname(output_filename))
-    with open(output_filename, 'w') as f:
-        f.write(result)
+    We can't tell which of the shared code applies to which command,
+    so any change to it changes the fingerprint of every command.
 
+    :rtype: dict
+    :return: A mapping of command name to fingerprint.  The
+        fingerprint is ``None`` if the command's model couldn't be
+        found, so the command is always indexed.
 
-def write_doc_index(output_filename=None, db=None, help_command=None):
+    """
+    command_table = help_command.command_table
+    loader = help_command.session.get_component('data_loader')
+    command_files = _command_source_files(command_table)
+    excluded = set()
+    for filenames in command_files.values():
+        excluded.update(filenames)
+    shared = hashlib.sha1(docutils.__version__.encode('utf-8'))
+    _hash_files(shared, [filename for filename in _shared_source_files()
+                         if filename not in excluded])
+    fingerprints = {}
+    for name in command_table:
+        filenames = list(command_files.get(name, []))
+        service_name = getattr(command_table[name], '_service_name', None)
+        if service_name is not None:
+            model_files = _model_files(loader, service_name)
+            if not model_files:
+                fingerprints[name] = None
+                continue
+            filenames.extend(model_files)
+        digest = shared.copy()
+        _hash_files(digest, filenames)
+        fingerprints[name] = digest.hexdigest()
+    return fingerprints
+
+
+def unchanged_services(previous_fingerprints, fingerprints):
+    """Return the names of the services with the same fingerprint."""
+    if not previous_fingerprints:
+        return []
+    return [name for name, fingerprint in fingerprints.items()
+            if fingerprint is not None and
+            previous_fingerprints.get(name) == fingerprint]
+
+
+def _hash_files(digest, filenames):
+    for filename in sorted(filenames):
+        with open(filename, 'rb') as f:
+            contents = f.read()
+        digest.update(('%s:' % len(contents)).encode('ascii'))
+        digest.update(contents)
+
+
+def _shared_source_files():
+    cli_dir = os.path.dirname(awscli.__file__)
+    for dirname, _, basenames in os.walk(cli_dir):
+        for basename in basenames:
+            filename = os.path.join(dirname, basename)
+            if basename.endswith(('.py', '.json')) and \
+                    filename != awscli.__file__:
+                # The CLI's __init__.py is excluded because it
+                # changes with every release, for the version.
+                yield filename
+    yield _source_file(botocore.model)
+    botocore_docs_dir = os.path.dirname(botocore.docs.__file__)
+    for dirname, _, basenames in os.walk(botocore_docs_dir):
+        for basename in basenames:
+            if basename.endswith('.py'):
+                yield os.path.join(dirname, basename)
+    yield _source_file(sys.modules[__name__])
+    yield _source_file(sys.modules['awsshell.utils'])
+
+
+def _source_file(module):
+    filename = module.__file__
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    return filename
+
+
+def _command_source_files(command_table):
+    # The CLI customizations and examples for each command,
+    # e.g. awscli/customizations/emr/ for 'emr'.
+    cli_dir = os.path.dirname(awscli.__file__)
+    command_files = {}
+    customizations_dir = os.path.join(cli_dir, 'customizations')
+    for basename in os.listdir(customizations_dir):
+        module_name = basename
+        if module_name.endswith('.py'):
+            module_name = module_name[:-len('.py')]
+        name = module_name.replace('_', '-')
+        if name in command_table:
+            path = os.path.join(customizations_dir, basename)
+            command_files.setdefault(name, []).extend(
+                _files_in(path, '.py'))
+    examples_dir = os.path.join(cli_dir, 'examples')
+    for name in command_table:
+        path = os.path.join(examples_dir, name)
+        command_files.setdefault(name, []).extend(_files_in(path))
+    return command_files
+
+
+def _files_in(path, extension=''):
+    if os.path.isfile(path):
+        return [path]
+    filenames = []
+    for dirname, _, basenames in os.walk(path):
+        for basename in basenames:
+            if basename.endswith(extension):
+                filenames.append(os.path.join(dirname, basename))
+    return filenames
+
+
+def _model_files(loader, service_name):
+    try:
+        api_version = loader.determine_latest_version(
+            service_name, MODEL_TYPES[0])
+    except botocore.exceptions.DataNotFoundError:
+        return []
+    filenames = []
+    for type_name in MODEL_TYPES:
+        for search_path in loader.search_paths:
+            path = os.path.join(search_path, service_name,
+                                api_version, type_name)
+            model_files = [path + extension for extension
+                           in ('.json', '.json.gz')
+                           if os.path.isfile(path + extension)]
+            if model_files:
+                # The first search path with the model
+                # is the one botocore uses.
+                filenames.append(model_files[0])
+                break
+    return filenames
+
+
+def write_index(output_filename=None, processes=None, previous_index=None):
+    index = build_index(processes=processes, previous_index=previous_index)
+    _write_index_file(output_filename, index)
+
+
+def _write_index_file(output_filename, index):
+    # The file is replaced atomically, so it never has a partially
+    # written index, and the header lets us detect a corrupt index.
+    FSLayer().write_file_contents(
+        output_filename, completion.dumps_index(index, utils.AWSCLI_VERSION))
+
+
+class BackgroundIndexBuilder(object):
+    """Build the completion index in a background thread.
+
+    The arguments of the root command and the list of services are
+    indexed when the builder is created, so the shell can start right
+    away with the top level commands.  :meth:`start` builds the index
+    in a background thread and adds each service to ``index_data`` as
+    soon as it's indexed, so completions fill in while the index is
+    being built.  Once every service is indexed, the index is written
+    to ``output_filename``.
+
+    The services are indexed in a separate process at a low priority
+    (see :func:`write_service_indices`), which streams each service's
+    index back to the thread.  This keeps indexing from slowing down
+    the shell, and the worker pool is never forked from a process
+    with other threads running.
+
+    :ivar index_data: The index being built, in the same form as
+        :meth:`awsshell.index.completion.CompletionIndex.load_index_data`.
+        The lexicon only has the top level commands and the global
+        options until every service is indexed.
+    :ivar on_update: Called from the background thread every time a
+        service is added to the index, and when the build is done.
+    :ivar done: Whether the build is over, because the index was
+        built or because it failed.
+    :ivar failed: Whether the build failed.
+
+    :type load_previous_index: callable
+    :param load_previous_index: Called in the background thread to load
+        the index of another CLI version, see ``previous_index`` in
+        :func:`build_index`.  It returns ``None`` if there isn't one.
+
+    See :func:`build_index` for the other arguments.
+
+    """
+    def __init__(self, output_filename, processes=None,
+                 load_previous_index=None):
+        self.output_filename = output_filename
+        self.on_update = None
+        self.done = False
+        self.failed = False
+        self._processes = processes
+        self._load_previous_index = load_previous_index
+        self._process = None
+        self._stopped = False
+        self._help_command = _create_help_command()
+        self._names = list(self._help_command.command_table)
+        self._indexed = 0
+        self._root = new_index()
+        _index_arguments(self._root, self._help_command)
+        root = IndexNode(
+            arguments=self._root['arguments'],
+            argument_metadata=self._root['argument_metadata'],
+            commands=list(self._names), children={})
+        self.index_data = {
+            'aws': root,
+            'lexicon': Lexicon(commands=list(self._names), subcommands=[],
+                               global_opts=list(root.arguments),
+                               args_opts=set()),
+        }
+
+    @property
+    def progress(self):
+        """The number of services indexed, and the number of services."""
+        return self._indexed, len(self._names)
+
+    def start(self):
+        """Start building the index in a daemon thread."""
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop indexing the services, e.g. when the shell exits."""
+        self._stopped = True
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            process.wait()
+
+    def run(self):
+        """Build the index in the current thread."""
+        try:
+            self._build()
+        except Exception:
+            # The shell keeps working with the services indexed so
+            # far, and the index is built again on the next run.
+            LOG.debug("Unable to build the completion index.", exc_info=True)
+            self.failed = True
+        finally:
+            # The CLI's commands and the previous index are only
+            # needed while building, don't hold on to them.
+            self._help_command = None
+            self._load_previous_index = None
+            self.done = True
+            self._notify()
+
+    def _build(self):
+        fingerprints = service_fingerprints(self._help_command)
+        previous_index = None
+        if self._load_previous_index is not None:
+            previous_index = self._load_previous_index()
+        root = self.index_data['aws']
+        children = {}
+        for name, index in _iter_copied_services(previous_index,
+                                                 fingerprints):
+            self._add_service(children, name, index)
+        # Don't hold on to the previous index while indexing.
+        del previous_index
+        changed = [name for name in self._names if name not in children]
+        LOG.debug("Indexing %s services, %s services are unchanged.",
+                  len(changed), len(children))
+        for name, index in self._iter_indexed_services(changed):
+            self._add_service(children, name, index)
+        index = _assemble_index(self._root, self._help_command,
+                                children, fingerprints)
+        _write_index_file(self.output_filename, index)
+        self.index_data['lexicon'] = Lexicon.from_index(root)
+
+    def _add_service(self, children, name, index):
+        children[name] = index
+        # Assigning the new node is atomic, so it's safe for
+        # the completer to look up services while we add them.
+        self.index_data['aws'].children[name] = IndexNode.from_dict(index)
+        self._indexed += 1
+        self._notify()
+
+    def _iter_indexed_services(self, names):
+        if not names:
+            return
+        if self._stopped:
+            raise IndexBuildError("The index build was stopped.")
+        errors = tempfile.TemporaryFile()
+        try:
+            with open(os.devnull, 'r') as devnull:
+                self._process = subprocess.Popen(
+                    _index_services_command(names, self._processes),
+                    stdin=devnull, stdout=subprocess.PIPE, stderr=errors,
+                    **compat.LOW_PRIORITY_POPEN_KWARGS)
+            for line in iter(self._process.stdout.readline, b''):
+                name, index = json.loads(line.decode('utf-8'))
+                yield name, index
+            returncode = self._process.wait()
+            if returncode != 0:
+                errors.seek(0)
+                raise IndexBuildError(
+                    "Indexing the services failed (exit status %s): %s" % (
+                        returncode,
+                        errors.read().decode('utf-8', 'replace').strip()))
+        finally:
+            if self._process is not None:
+                self.stop()
+                self._process.stdout.close()
+            errors.close()
+
+    def _notify(self):
+        if self.on_update is not None:
+            self.on_update()
+
+
+def _index_services_command(names, processes):
+    args = [sys.executable, '-m', 'awsshell.makeindex']
+    if processes is not None:
+        args.extend(['--processes', str(processes)])
+    return args + ['--index-services'] + names
+
+
+def write_service_indices(names, output, processes=None):
+    """Write the completion index of each service in ``names``.
+
+    This is run by :class:`BackgroundIndexBuilder` in a separate
+    process, at a low priority.  Each service is written to the
+    ``output`` file object as soon as it's indexed, as a line with
+    the JSON list ``[name, index]``.
+
+    """
+    _lower_priority()
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    help_command = _create_help_command()
+    for name, index in _iter_indexed_services(help_command, names,
+                                              processes):
+        output.write(json.dumps([name, index]).encode('utf-8') + b'\n')
+        output.flush()
+
+
+def write_doc_index(output_filename=None, db=None, help_command=None,
+                    previous_filename=None, processes=None):
     if output_filename is None:
         output_filename = determine_doc_index_filename()
     user_provided_db = True
     if db is None:
         user_provided_db = False
         db = docs.load_doc_db(output_filename)
+    fingerprints = None
     if help_command is None:
-        driver = awscli.clidriver.create_clidriver()
-        help_command = driver.create_help_command()
+        help_command = _create_help_command()
+        # Only the docs for every command can be reused
+        # by the next version of the CLI.
+        fingerprints = service_fingerprints(help_command)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+    else:
+        # The worker processes can only render the CLI's own commands.
+        processes = 1
+    previous_db = None
+    if previous_filename is not None and fingerprints is not None:
+        previous_db = docs.load_doc_db(previous_filename)
 
     should_close = not user_provided_db
-    do_write_doc_index(db, help_command, close_db_on_finish=should_close)
+    try:
+        do_write_doc_index(db, help_command, close_db_on_finish=should_close,
+                           fingerprints=fingerprints, previous_db=previous_db,
+                           processes=processes)
+    finally:
+        if previous_db is not None:
+            previous_db.close()
+
+
+def do_write_doc_index(db, help_command, close_db_on_finish,
+                       fingerprints=None, previous_db=None, processes=1):
+    """Write the docs for every command in ``help_command`` to ``db``.
 
+    If ``fingerprints`` (see :func:`service_fingerprints`) is given, it's
+    stored in ``db`` along with the docs.  The docs of the commands whose
+    fingerprint is the same as in ``previous_db``, the completed doc
+    index of another CLI version, are copied rather than rendered.
 
-def do_write_doc_index(db, help_command, close_db_on_finish):
+    If ``processes`` is more than 1, the services are rendered in a
+    pool of worker processes and each service's docs are written to
+    ``db`` as soon as its worker is done.  The workers render the
+    commands of the CLI's own help command, so ``help_command`` must
+    be the CLI's help command.
+
+    The docs of each service are written with ``db.update()``, in a
+    single transaction for a :class:`awsshell.db.ConcurrentDBM`, along
+    with a ``__done__.<service>`` key with the service's fingerprint.
+    If the doc index was only partially written, e.g. because the
+    shell exited, the services that are already done are skipped, so
+    the next run picks up where the last one left off.
+    ``__complete__`` is only set once every service is done.
+
+    """
     try:
-        _index_docs(db, help_command)
-        db['__complete__'] = 'true'
+        done = _done_services(db, help_command.command_table, fingerprints)
+        unchanged = set()
+        if previous_db is not None and fingerprints is not None:
+            unchanged.update(unchanged_services(
+                _doc_fingerprints(previous_db), fingerprints))
+        changed = []
+        for command_name in help_command.command_table:
+            if command_name in done:
+                continue
+            if command_name in unchanged and \
+                    _copy_docs(db, previous_db, command_name, fingerprints):
+                continue
+            changed.append(command_name)
+        LOG.debug("Writing the docs of %s services, %s services are "
+                  "already done.", len(changed), len(done))
+        for command_name, service_docs in _iter_service_docs(
+                help_command, changed, processes):
+            service_docs = list(service_docs)
+            service_docs.append(_done_item(command_name, fingerprints))
+            db.update(service_docs)
+        final = [('__complete__', 'true')]
+        if fingerprints is not None:
+            final.insert(0, ('__fingerprints__', json.dumps(fingerprints)))
+        db.update(final)
     finally:
         if close_db_on_finish:
             # If the user provided their own db object,
@@ -101,14 +671,85 @@ def do_write_doc_index(db, help_command, close_db_on_finish):
             db.close()
 
 
-def _index_docs(db, help_command):
-    for command_name in help_command.command_table:
-        command = help_command.command_table[command_name]
-        sub_help_command = command.create_help_command()
-        text_docs = render_docs_for_cmd(sub_help_command)
-        dotted_name = '.'.join(['aws'] + command.lineage_names)
-        db[dotted_name] = text_docs
-        _index_docs(db, sub_help_command)
+def _done_services(db, command_table, fingerprints):
+    # A service is only done if its docs were written for
+    # the same fingerprint.
+    done = set()
+    for command_name in command_table:
+        try:
+            fingerprint = db[DOCS_DONE_PREFIX + command_name]
+        except KeyError:
+            continue
+        if fingerprints is None or \
+                fingerprint == (fingerprints.get(command_name) or ''):
+            done.add(command_name)
+    return done
+
+
+def _done_item(command_name, fingerprints):
+    fingerprint = None
+    if fingerprints is not None:
+        fingerprint = fingerprints.get(command_name)
+    return DOCS_DONE_PREFIX + command_name, fingerprint or ''
+
+
+def _doc_fingerprints(db):
+    # Only a complete doc index has all the docs for its fingerprints.
+    try:
+        db['__complete__']
+        return json.loads(db['__fingerprints__'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _copy_docs(db, previous_db, command_name, fingerprints):
+    dotted_name = 'aws.%s' % command_name
+    service_docs = previous_db.items(
+        docs.section_key(dotted_name, ''))
+    if not service_docs:
+        # The previous docs weren't split into sections.
+        return False
+    service_docs.extend(previous_db.items(dotted_name + '.'))
+    service_docs.append(_done_item(command_name, fingerprints))
+    db.update(service_docs)
+    return True
+
+
+def _iter_service_docs(help_command, names, processes):
+    # Yields (service name, docs) for each service in ``names``, where
+    # docs is an iterable of the (dotted name, docs) of every command
+    # of the service.  The services are rendered in a pool if
+    # processes > 1, in which case they're yielded as they finish.
+    if processes <= 1 or len(names) <= 1:
+        for name in names:
+            yield name, _iter_command_docs(help_command.command_table[name])
+        return
+    LOG.debug("Rendering the docs of %s services in %s processes.",
+              len(names), processes)
+    pool = multiprocessing.Pool(min(processes, len(names)))
+    try:
+        for result in pool.imap_unordered(_render_service_docs, names):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _render_service_docs(name):
+    command = _worker_help_command().command_table[name]
+    return name, list(_iter_command_docs(command))
+
+
+def _iter_command_docs(command):
+    sub_help_command = command.create_help_command()
+    dotted_name = '.'.join(['aws'] + command.lineage_names)
+    sections = split_doc_sections(render_docs_for_cmd(sub_help_command))
+    for section, text_docs in sections:
+        yield docs.section_key(dotted_name, section), text_docs
+    for command_name in sub_help_command.command_table:
+        for item in _iter_command_docs(
+                sub_help_command.command_table[command_name]):
+            yield item
 
 
 def render_docs_for_cmd(help_command):
@@ -125,6 +766,64 @@ def render_docs_for_cmd(help_command):
     return text_content
 
 
+def split_doc_sections(text_docs):
+    """Split the rendered docs of a command into sections.
+
+    The shell shows the description of a command, or the docs of
+    the option being typed, so the doc index stores each of them
+    separately rather than searching the full docs every time.
+
+    :type text_docs: str
+    :param text_docs: The docs from :func:`render_docs_for_cmd`.
+
+    :rtype: list
+    :return: A list of (section, text) tuples.  The sections are
+        ``description``, ``synopsis``, ``examples``, ``output``, and
+        the name of each option, e.g. ``--instance-ids``.  The docs
+        of services and other commands without a synopsis only have
+        a description.
+
+    """
+    titles = {}
+    matches = []
+    for match in DOC_SECTION_TITLES.finditer(text_docs):
+        if match.group(1) not in titles:
+            titles[match.group(1)] = match
+            matches.append(match)
+    if 'SYNOPSIS' not in titles:
+        return [('description', text_docs)]
+    sections = [('description', text_docs[:titles['SYNOPSIS'].start()])]
+    for i, match in enumerate(matches):
+        end = len(text_docs)
+        if i + 1 < len(matches):
+            end = matches[i + 1].start()
+        body = text_docs[match.end():end].strip('\n')
+        title = match.group(1)
+        if title == 'OPTIONS':
+            sections.extend(_split_options(body))
+        else:
+            sections.append((title.lower(), body))
+    return sections
+
+
+def _split_options(options_docs):
+    if options_docs.endswith(GLOBAL_PARAMETERS_NOTE):
+        options_docs = options_docs[
+            :-len(GLOBAL_PARAMETERS_NOTE)].rstrip('\n')
+    starts = list(OPTION_DOCS_START.finditer(options_docs))
+    sections = []
+    for i, match in enumerate(starts):
+        end = len(options_docs)
+        if i + 1 < len(starts):
+            end = starts[i + 1].start()
+        option_docs = options_docs[match.start():end].rstrip('\n')
+        # A boolean option's docs are shown for both of its names.
+        for name in match.groups():
+            if name is not None:
+                sections.append((name.replace('\n', ''), option_docs))
+    return sections
+
+
 def convert_rst_to_basic_text(contents):
     """Convert restructured text to basic text output.
 
@@ -184,3 +883,119 @@ class BasicTextTranslator(textwriter.TextTranslator):
 
     def depart_literal(self, node):
         pass
+
+
+def write_shared_indices(output_dir, processes=None, include_docs=True):
+    """Write the completion and doc indices for every user on the host.
+
+    The indices for the installed CLI are written to ``output_dir``,
+    which the aws-shell searches before the per user cache (see
+    :func:`awsshell.utils.shared_index_dirs`).  The services that
+    didn't change since the previous version's indices in
+    ``output_dir`` are copied from them.
+
+    """
+    version_string = utils.AWSCLI_VERSION
+    indexer = completion.CompletionIndex(cache_dir=output_dir, search_dirs=[])
+    previous_index = indexer.load_previous_index_data(version_string)
+    index = build_index(processes=processes, previous_index=previous_index)
+    _write_index_file(
+        indexer._filename_for_version(version_string), index)
+    indexer.write_binary_index(index, version_string)
+    if not include_docs:
+        return
+    doc_index_file = os.path.join(
+        output_dir, os.path.basename(determine_doc_index_filename()))
+    # The doc index is written in place, so we write it to a temporary
+    # file so that users never see a partial doc index.  If a previous
+    # run was interrupted, it's resumed from the temporary file.
+    temp_filename = doc_index_file + '.tmp'
+    write_doc_index(
+        temp_filename, processes=processes,
+        previous_filename=find_previous_doc_index_filename(output_dir))
+    # Users can't open a database in WAL mode in a directory
+    # they can't write to.
+    db = docs.load_doc_db(temp_filename)
+    try:
+        db.disable_wal()
+    finally:
+        db.close()
+    replace_file(temp_filename, doc_index_file)
+
+
+def write_user_doc_index(doc_index_file, processes=None):
+    """Write the doc index of the shell's user.
+
+    This is run by :func:`awsshell.start_doc_index_build` in a
+    separate process, at a low priority, so rendering the docs
+    doesn't slow down the shell.
+
+    """
+    _lower_priority()
+    # The shell stops the build with SIGTERM when it exits, make sure
+    # the worker processes and the db are cleaned up.
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    write_doc_index(
+        doc_index_file, processes=processes,
+        previous_filename=find_previous_doc_index_filename(
+            os.path.dirname(os.path.abspath(doc_index_file))))
+
+
+def _lower_priority():
+    # The worker processes inherit the priority.  On windows the
+    # process is started with a lower priority class instead.
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            LOG.debug("Unable to lower the priority.", exc_info=True)
+
+
+def _exit_on_signal(signum, frame):
+    sys.exit(128 + signum)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Generate the aws-shell completion and doc indices '
+        'for the installed AWS CLI in a directory shared by every user.')
+    parser.add_argument('-o', '--output-dir', default=utils.SYSTEM_INDEX_DIR,
+                        help='The directory to write the indices to.  '
+                        'Defaults to %s.  Other directories are '
+                        'searched if they\'re in the %s environment '
+                        'variable.' % (utils.SYSTEM_INDEX_DIR,
+                                       utils.INDEX_PATH_ENV_VAR))
+    parser.add_argument('-p', '--processes', type=int,
+                        help='The number of processes used to build the '
+                        'indices.  Defaults to the number of CPUs.')
+    parser.add_argument('--no-docs', action='store_true',
+                        help='Only write the completion index.')
+    parser.add_argument('--user-doc-index', metavar='FILENAME',
+                        help='Only write the doc index to FILENAME, at a '
+                        'low priority.  This is how the aws-shell builds '
+                        'the doc index of each user.')
+    parser.add_argument('--index-services', nargs='+', metavar='SERVICE',
+                        help='Only write the completion index of each '
+                        'SERVICE to stdout, one JSON line per service, at '
+                        'a low priority.  This is how the aws-shell builds '
+                        'the completion index in the background.')
+    parsed_args = parser.parse_args(args)
+    if parsed_args.index_services:
+        output = getattr(sys.stdout, 'buffer', sys.stdout)
+        # Anything else written to stdout would corrupt the indices.
+        sys.stdout = sys.stderr
+        write_service_indices(parsed_args.index_services, output,
+                              processes=parsed_args.processes)
+        return 0
+    if parsed_args.user_doc_index:
+        write_user_doc_index(parsed_args.user_doc_index,
+                             processes=parsed_args.processes)
+        return 0
+    write_shared_indices(parsed_args.output_dir,
+                         processes=parsed_args.processes,
+                         include_docs=not parsed_args.no_docs)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
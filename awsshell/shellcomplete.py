@@ -19,6 +19,10 @@ from awsshell import fuzzy
 
 
 LOG = logging.getLogger(__name__)
+# Server side completion can return thousands of values.  While the
+# user is typing we only show the best matches, the full list is
+# shown when completion is explicitly requested (e.g. pressing tab).
+MAX_SERVER_SIDE_COMPLETIONS = 100
 
 
 class AWSShellCompleter(Completer):
@@ -54,6 +58,7 @@ class AWSShellCompleter(Completer):
         """Change the profile used for server side completions."""
         self._server_side_completer = self._create_server_side_completer(
             session=botocore.session.Session(profile=profile_name))
+        self._clear_completion_cache()
 
     @property
     def completer(self):
@@ -61,8 +66,18 @@ class AWSShellCompleter(Completer):
 
     @completer.setter
     def completer(self, value):
+        # A new completer means a new index, so none of the
+        # cached completions for the previous index apply.
+        self._clear_completion_cache()
         self._completer = value
 
+    def _clear_completion_cache(self):
+        cache = getattr(self._completer, 'completion_cache', None)
+        if cache is not None:
+            LOG.debug("Clearing completion cache, hits: %s, misses: %s",
+                      cache.hits, cache.misses)
+            cache.clear()
+
     @property
     def last_option(self):
         return self._completer.last_option
@@ -77,8 +92,7 @@ class AWSShellCompleter(Completer):
         # and converts them to Completion() objects used by
         # prompt_toolkit.  We also try to enhance the metadata of the
         # completion by including docs and marking required fields.
-        arg_meta = self._completer.arg_metadata
-        arg_meta.update(self._completer.global_arg_metadata)
+        arg_meta = self._completer.all_arg_metadata
         word_before_cursor = ''
         if text_before_cursor.strip():
             word_before_cursor = text_before_cursor.strip().split()[-1]
@@ -141,7 +155,12 @@ class AWSShellCompleter(Completer):
                         word_before_cursor and results:
                     # Filter the results down by fuzzy searching what
                     # the user has provided.
-                    results = fuzzy.fuzzy_search(word_before_cursor, results)
+                    limit = MAX_SERVER_SIDE_COMPLETIONS
+                    if complete_event is not None and \
+                            complete_event.completion_requested:
+                        limit = None
+                    results = fuzzy.fuzzy_search(word_before_cursor, results,
+                                                 limit=limit)
                     location = -len(word_before_cursor)
                 if results is not None:
                     for result in results:
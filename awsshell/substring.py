@@ -10,6 +10,7 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+import bisect
 
 
 def substring_search(word, collection):
@@ -17,6 +18,9 @@ def substring_search(word, collection):
 
     If `word` is empty, returns all items in `collection`.
 
+    If you're searching the same collection more than once, create a
+    :class:`PrefixIndex` instead so the collection is only sorted once.
+
     :type word: str
     :param word: The substring to search for.
 
@@ -26,4 +30,41 @@ def substring_search(word, collection):
     :rtype: list of strings
     :return: A sorted list of matching words from collection.
     """
-    return [item for item in sorted(collection) if item.startswith(word)]
+    return PrefixIndex(collection).search(word)
+
+
+class PrefixIndex(object):
+    """An index of words that can be searched by prefix.
+
+    The words are sorted once when the index is created.  All the
+    words that start with a given prefix are then next to each other,
+    so a search is a binary search for the first match followed by
+    a scan over the matches, O(log n + k), instead of sorting and
+    checking every word in the collection.
+
+    :type collection: collection, usually a list
+    :param collection: A collection of words to index.
+    """
+    def __init__(self, collection):
+        self._words = sorted(collection)
+
+    def __len__(self):
+        return len(self._words)
+
+    def search(self, word):
+        """Find all the words in the index that start with `word`.
+
+        :type word: str
+        :param word: The prefix to search for.
+
+        :rtype: list of strings
+        :return: A sorted list of matching words.  This is the same
+            result as ``substring_search(word, collection)``.
+        """
+        words = self._words
+        start = bisect.bisect_left(words, word)
+        end = start
+        total = len(words)
+        while end < total and words[end].startswith(word):
+            end += 1
+        return words[start:end]
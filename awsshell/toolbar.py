@@ -22,13 +22,16 @@ class Toolbar(object):
     """
 
     def __init__(self, get_match_fuzzy, get_enable_vi_bindings,
-                 get_show_completion_columns, get_show_help):
+                 get_show_completion_columns, get_show_help,
+                 get_index_progress=None):
         self.handler = self._create_toolbar_handler(
             get_match_fuzzy, get_enable_vi_bindings,
-            get_show_completion_columns, get_show_help)
+            get_show_completion_columns, get_show_help,
+            get_index_progress)
 
     def _create_toolbar_handler(self, get_match_fuzzy, get_enable_vi_bindings,
-                                get_show_completion_columns, get_show_help):
+                                get_show_completion_columns, get_show_help,
+                                get_index_progress=None):
         """Create the toolbar handler.
 
         :type get_fuzzy_match: callable
@@ -45,6 +48,11 @@ class Toolbar(object):
         :type get_show_help: callable
         :param get_show_help: Gets the show help pane config.
 
+        :type get_index_progress: callable
+        :param get_index_progress: Gets the progress of building the
+            completion index as a tuple of (services indexed, services),
+            or None if the index isn't being built.
+
         :rtype: callable
         :returns: get_toolbar_items.
 
@@ -53,6 +61,8 @@ class Toolbar(object):
         assert callable(get_enable_vi_bindings)
         assert callable(get_show_completion_columns)
         assert callable(get_show_help)
+        if get_index_progress is None:
+            get_index_progress = lambda: None
 
         def get_toolbar_items(cli):
             """Return the toolbar items.
@@ -91,7 +101,7 @@ class Toolbar(object):
                 show_buffer_name = 'cli'
             else:
                 show_buffer_name = 'doc'
-            return [
+            items = [
                 (match_fuzzy_token,
                  ' [F2] Fuzzy: {0} '.format(match_fuzzy_cfg)),
                 (enable_vi_bindings_token,
@@ -105,5 +115,11 @@ class Toolbar(object):
                 (Token.Toolbar,
                  ' [F10] Exit ')
             ]
+            index_progress = get_index_progress()
+            if index_progress is not None:
+                items.append(
+                    (Token.Toolbar.Off,
+                     ' Indexing: {0}/{1} '.format(*index_progress)))
+            return items
 
         return get_toolbar_items
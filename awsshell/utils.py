@@ -1,22 +1,39 @@
 """Utility module for misc aws shell functions."""
 from __future__ import print_function
 import os
+import re
+import mmap
 import contextlib
 import tempfile
 import uuid
 
 import awscli
 
-from awsshell.compat import HTMLParser
+from awsshell.compat import HTMLParser, Mapping, replace_file, ON_WINDOWS
 
 
 AWSCLI_VERSION = awscli.__version__
+# The indices can be generated ahead of time with aws-shell-mkindex and
+# shared by every user on a host.  This is the directory that they're
+# written to by default, and the last directory they're searched for in.
+if ON_WINDOWS:
+    SYSTEM_INDEX_DIR = os.path.join(
+        os.environ.get('PROGRAMDATA', 'C:\\ProgramData'), 'aws-shell')
+else:
+    SYSTEM_INDEX_DIR = '/usr/local/share/aws-shell'
+# Additional directories to search for shared indices, separated by
+# os.pathsep.  These are searched before SYSTEM_INDEX_DIR.
+INDEX_PATH_ENV_VAR = 'AWS_SHELL_INDEX_PATH'
 
 
 class FileReadError(Exception):
     pass
 
 
+class FileWriteError(Exception):
+    pass
+
+
 def remove_html(html):
     s = DataOnly()
     s.feed(html)
@@ -27,6 +44,57 @@ def build_config_file_path(file_name):
     return os.path.join(os.path.expanduser('~'), '.aws', 'shell', file_name)
 
 
+def shared_index_dirs(environ=None):
+    """Return the directories to search for shared, read only indices.
+
+    The directories in the ``AWS_SHELL_INDEX_PATH`` environment
+    variable come first, followed by ``SYSTEM_INDEX_DIR``.
+
+    """
+    if environ is None:
+        environ = os.environ
+    dirs = [dirname for dirname in
+            environ.get(INDEX_PATH_ENV_VAR, '').split(os.pathsep) if dirname]
+    dirs.append(SYSTEM_INDEX_DIR)
+    return dirs
+
+
+def other_versions(filenames, template, version_string):
+    """Find the files for other versions of a versioned file.
+
+    :type filenames: list
+    :param filenames: The filenames to search, e.g. the
+        contents of a directory.
+
+    :type template: str
+    :param template: The filename with a ``%s`` where the version
+        goes, e.g. ``'completions-%s.json'``.
+
+    :type version_string: str
+    :param version_string: The current version, which is excluded.
+
+    :rtype: list
+    :return: The matching filenames, newest version first.
+
+    """
+    prefix, suffix = template.split('%s')
+    pattern = re.compile(
+        '^%s(.+)%s$' % (re.escape(prefix), re.escape(suffix)))
+    versions = []
+    for filename in filenames:
+        match = pattern.match(filename)
+        if match is not None and match.group(1) != version_string:
+            versions.append((_version_key(match.group(1)), filename))
+    return [filename for _, filename in sorted(versions, reverse=True)]
+
+
+def _version_key(version_string):
+    # '1.10.2' -> (1, 10, 2).  A part that isn't a number, e.g.
+    # the 'x' in '1.10.x', sorts before every number.
+    return tuple(int(part) if part.isdigit() else -1
+                 for part in version_string.split('.'))
+
+
 @contextlib.contextmanager
 def temporary_file(mode):
     """Cross platform temporary file creation.
@@ -63,6 +131,122 @@ class DataOnly(HTMLParser):
         return ''.join(self.lines)
 
 
+class LayeredMapping(Mapping):
+    """A read-only view over a list of mappings.
+
+    Lookups try each mapping in order and return the first match,
+    so earlier mappings take precedence over later ones.  None of
+    the underlying mappings are copied or modified.
+
+    """
+    def __init__(self, *mappings):
+        self._mappings = mappings
+
+    def __getitem__(self, key):
+        for mapping in self._mappings:
+            try:
+                return mapping[key]
+            except KeyError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        seen = set()
+        for mapping in self._mappings:
+            for key in mapping:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class LRUCache(object):
+    """A bounded mapping that evicts the least recently used key.
+
+    The cache holds up to ``max_size`` keys.  If ``get_size`` is
+    given, it's called with each value instead, and the cache holds
+    values whose sizes add up to at most ``max_size``.  A value that's
+    larger than ``max_size`` on its own isn't cached.
+
+    The number of lookups that found a value (``hits``) and that
+    didn't (``misses``) are tracked so the cache's effectiveness
+    can be logged.
+
+    """
+    # The entries are [previous, next, key, value, size] lists in a
+    # circular doubly linked list, from the least to the most recently
+    # used, so they can be moved and evicted in constant time.
+    # OrderedDict isn't available on python 2.6.
+    _PREV, _NEXT, _KEY, _VALUE, _SIZE = range(5)
+
+    def __init__(self, max_size, get_size=None):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._get_size = get_size
+        self._entries = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, 0]
+
+    def get(self, key, default=None):
+        try:
+            entry = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._unlink(entry)
+        self._append(entry)
+        self.hits += 1
+        return entry[self._VALUE]
+
+    def put(self, key, value):
+        self._remove(key)
+        size = 1
+        if self._get_size is not None:
+            size = self._get_size(value)
+        if size > self.max_size:
+            return
+        entry = [None, None, key, value, size]
+        self._append(entry)
+        self._entries[key] = entry
+        self.size += size
+        while self.size > self.max_size:
+            self._remove(self._root[self._NEXT][self._KEY])
+
+    def clear(self):
+        self._entries.clear()
+        self._root[:] = [self._root, self._root, None, None, 0]
+        self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unlink(entry)
+            self.size -= entry[self._SIZE]
+
+    def _unlink(self, entry):
+        previous, following = entry[self._PREV], entry[self._NEXT]
+        previous[self._NEXT] = following
+        following[self._PREV] = previous
+
+    def _append(self, entry):
+        # Insert the entry as the most recently used.
+        last = self._root[self._PREV]
+        entry[self._PREV] = last
+        entry[self._NEXT] = self._root
+        last[self._NEXT] = entry
+        self._root[self._PREV] = entry
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class FSLayer(object):
     """Abstraction over common OS commands.
 
@@ -86,6 +270,20 @@ class FSLayer(object):
         except (OSError, IOError) as e:
             raise FileReadError(str(e))
 
+    def map_file(self, filename):
+        """Return a read only memory map of the file for a given filename.
+
+        The map supports ``len()`` and slicing like ``bytes``, but
+        the file is only read from disk as it's accessed.
+
+        """
+        try:
+            with open(filename, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, IOError, ValueError) as e:
+            # mmap raises a ValueError for empty files.
+            raise FileReadError(str(e))
+
     def file_exists(self, filename):
         """Check if a file exists.
 
@@ -97,14 +295,66 @@ class FSLayer(object):
         """
         return os.path.isfile(filename)
 
+    def list_files(self, dirname):
+        """Return the names of the files in a directory.
+
+        An empty list is returned if the directory doesn't exist.
+
+        """
+        try:
+            names = os.listdir(dirname)
+        except (OSError, IOError):
+            return []
+        return [name for name in names
+                if os.path.isfile(os.path.join(dirname, name))]
+
+    def write_file_contents(self, filename, contents, binary=False):
+        """Write contents to a file, creating its directory if needed.
+
+        If you're writing binary content use ``binary=True``.
+
+        The contents are written to a temporary file that's renamed
+        to ``filename``, so ``filename`` either has its previous
+        contents or all of the new contents, even if the process is
+        killed while writing.
+
+        """
+        if binary:
+            mode = 'wb'
+        else:
+            mode = 'w'
+        # Unlike tempfile.mkstemp(), open() creates the file with the
+        # permissions allowed by the umask, so a shared index is
+        # readable by other users.
+        temp_filename = '%s.%s.tmp' % (filename, uuid.uuid4().hex)
+        try:
+            dirname = os.path.dirname(filename)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(temp_filename, mode) as f:
+                f.write(contents)
+            replace_file(temp_filename, filename)
+        except (OSError, IOError) as e:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise FileWriteError(str(e))
+
+    def remove_file(self, filename):
+        """Remove a file, if it exists."""
+        try:
+            if os.path.isfile(filename):
+                os.remove(filename)
+        except (OSError, IOError) as e:
+            raise FileWriteError(str(e))
+
 
 class InMemoryFSLayer(object):
     """Same interface as FSLayer with an in memory implementation."""
 
     def __init__(self, file_mapping):
         # path -> file_contents
-        # file_contents are expected to be text, not
-        # binary.
+        # file_contents are expected to be text, unless
+        # they were written with binary=True.
         self._file_mapping = file_mapping
 
     def file_contents(self, filename, binary=False):
@@ -112,9 +362,22 @@ class InMemoryFSLayer(object):
             contents = self._file_mapping[filename]
         except KeyError:
             raise FileReadError(filename)
-        if binary:
+        if binary and not isinstance(contents, bytes):
             contents = contents.encode('utf-8')
         return contents
 
+    def map_file(self, filename):
+        return self.file_contents(filename, binary=True)
+
     def file_exists(self, filename):
         return filename in self._file_mapping
+
+    def list_files(self, dirname):
+        return [os.path.basename(filename) for filename in self._file_mapping
+                if os.path.dirname(filename) == dirname]
+
+    def write_file_contents(self, filename, contents, binary=False):
+        self._file_mapping[filename] = contents
+
+    def remove_file(self, filename):
+        self._file_mapping.pop(filename, None)
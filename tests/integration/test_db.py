@@ -53,3 +53,73 @@ def test_can_create_and_open_db(tmpdir):
     # Should be able to reopen the database and look up 'foo'.
     d = db.ConcurrentDBM.open(filename)
     assert d['foo'] == 'bar'
+
+
+def test_can_get_items_with_prefix(shell_db):
+    shell_db['aws.ec2'] = 'a'
+    shell_db['aws.ec2.run-instances'] = 'b'
+    shell_db['aws.ec2-instance-connect'] = 'c'
+    shell_db['aws.s3'] = 'd'
+    assert sorted(shell_db.items('aws.ec2.')) == [
+        ('aws.ec2.run-instances', 'b')]
+    assert len(shell_db.items()) == 4
+
+
+def test_can_get_items_with_prefix_and_suffix(shell_db):
+    shell_db['aws.ec2.run-instances#description'] = 'a'
+    shell_db['aws.ec2.run-instances#--image-id'] = 'b'
+    shell_db['aws.ec2.stop-instances#description'] = 'c'
+    shell_db['aws.s3.ls#description'] = 'd'
+    assert sorted(shell_db.items('aws.ec2.', '#description')) == [
+        ('aws.ec2.run-instances#description', 'a'),
+        ('aws.ec2.stop-instances#description', 'c'),
+    ]
+    assert len(shell_db.items(suffix='#description')) == 3
+
+
+def test_can_update_multiple_values(shell_db):
+    shell_db['foo'] = 'old'
+    shell_db.update([('foo', 'a'), ('bar', 'b')])
+    assert shell_db['foo'] == 'a'
+    assert shell_db['bar'] == 'b'
+
+
+def test_failed_update_writes_nothing(shell_db):
+    with pytest.raises(ValueError):
+        shell_db.update(_fail_after([('foo', 'a')]))
+    with pytest.raises(KeyError):
+        shell_db['foo']
+
+
+def _fail_after(items):
+    for item in items:
+        yield item
+    raise ValueError("Failed to render the docs.")
+
+
+def test_can_read_while_a_write_is_in_progress(tmpdir):
+    filename = tmpdir.join('docs.db').strpath
+    writer = db.ConcurrentDBM.create(filename)
+    writer['foo'] = 'committed'
+    reader = db.ConcurrentDBM.open(filename)
+    # A reader doesn't wait for the writer's transaction, it sees
+    # the last committed value.
+    writer.update(_read_during_write(reader, [('foo', 'new')]))
+    assert reader['foo'] == 'new'
+
+
+def _read_during_write(reader, items):
+    for item in items:
+        yield item
+    assert reader['foo'] == 'committed'
+
+
+def test_can_disable_wal_for_read_only_db(tmpdir):
+    filename = tmpdir.join('docs.db').strpath
+    d = db.ConcurrentDBM.create(filename)
+    d['foo'] = 'bar'
+    d.disable_wal()
+    d.close()
+    assert not tmpdir.join('docs.db-wal').check()
+    d = db.ConcurrentDBM.open(filename)
+    assert d['foo'] == 'bar'
@@ -0,0 +1,97 @@
+import awscli.clidriver
+import pytest
+
+from awsshell import fuzzy
+from awsshell import makeindex
+
+
+def reference_score(search_string, word):
+    # The original implementation of fuzzy.calculate_score().
+    # The optimized scorer must produce exactly the same scores.
+    if len(search_string) > len(word):
+        return 0
+    original_word = word
+    score = 1
+    search_index = 0
+    while True:
+        scale = 1.0
+        search_char = search_string[search_index]
+        i = word.find(search_char)
+        if i < 0:
+            return 0
+        if i > 0 and word[i - 1] == '-':
+            scale = 0.95
+        else:
+            scale = 1 - (i / float(len(word)))
+        score *= scale
+        word = word[i + 1:]
+        search_index += 1
+        if search_index >= len(search_string):
+            break
+    completion_scale = 1 - (len(word) / float(len(original_word)))
+    score *= completion_scale
+    return score
+
+
+def reference_search(user_input, corpus):
+    candidates = []
+    for word in corpus:
+        current_score = reference_score(user_input, word)
+        if current_score > 0:
+            candidates.append((word, current_score))
+    return [c[0] for c in sorted(candidates, key=lambda x: x[1], reverse=True)]
+
+
+@pytest.fixture(scope='module')
+def ec2_index():
+    driver = awscli.clidriver.create_clidriver()
+    help_command = driver.create_help_command()
+    ec2 = help_command.command_table['ec2'].create_help_command()
+    index = makeindex.new_index()
+    makeindex.index_command(index, ec2)
+    return index
+
+
+def queries_for(words):
+    # Prefixes and word boundary initials, e.g. for
+    # "describe-instances" we'll search for "d", "de", "des",
+    # "describe-instances" and "di".
+    queries = set()
+    for word in words:
+        for i in range(1, 4):
+            queries.add(word[:i])
+        queries.add(word)
+        queries.add(''.join(part[:1] for part in word.split('-')))
+    return sorted(queries)
+
+
+def test_golden_ranking_for_operations(ec2_index):
+    operations = ec2_index['commands']
+    corpus = fuzzy.FuzzyCorpus(operations)
+    for query in queries_for(operations):
+        expected = reference_search(query, operations)
+        assert fuzzy.fuzzy_search(query, operations) == expected
+        assert fuzzy.fuzzy_search(query, corpus) == expected
+        assert fuzzy.fuzzy_search(query, corpus, limit=16) == expected[:16]
+
+
+def test_golden_scores_for_arguments(ec2_index):
+    arguments = set()
+    for operation in ec2_index['children'].values():
+        arguments.update(operation['arguments'])
+    arguments = sorted(arguments)
+    for query in queries_for(arguments[::10]):
+        for argument in arguments:
+            assert fuzzy.calculate_score(query, argument) == \
+                reference_score(query, argument)
+
+
+def test_golden_ranking_for_vectorized_arguments(ec2_index):
+    pytest.importorskip('numpy')
+    arguments = set()
+    for operation in ec2_index['children'].values():
+        arguments.update(operation['arguments'])
+    arguments = sorted(arguments)
+    corpus = fuzzy.VectorizedCorpus(arguments)
+    for query in queries_for(arguments[::10]):
+        assert corpus.search(query) == reference_search(query, arguments)
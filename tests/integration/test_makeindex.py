@@ -1,5 +1,11 @@
+import sys
+import copy
+import json
+
+import awscli
 import awscli.clidriver
 from awsshell import makeindex
+from awsshell.index import completion
 
 import pytest
 
@@ -38,12 +44,165 @@ def test_can_document_all_service_commands(cloudformation_command):
     makeindex.write_doc_index(db=db, help_command=help_command)
     # Again, we don't want these to fail when cloudformation has
     # API updates so I don't have very strict checking.
-    assert 'aws.cloudformation.create-stack' in db
-    assert 'aws.cloudformation.delete-stack' in db
-    assert 'SYNOPSIS' in db['aws.cloudformation.create-stack']
+    assert 'aws.cloudformation.create-stack#description' in db
+    assert 'aws.cloudformation.delete-stack#description' in db
+    assert 'create-stack' in db['aws.cloudformation.create-stack#synopsis']
+    assert '--stack-name' in db['aws.cloudformation.create-stack#--stack-name']
 
 
 def test_can_index_a_command(cloudformation_command):
     help_command = cloudformation_command.create_help_command()
     index = makeindex.new_index()
     makeindex.index_command(index, help_command)
+
+
+@pytest.fixture(scope='module')
+def serial_index():
+    return makeindex.build_index(processes=1)
+
+
+def test_parallel_index_matches_serial_index(serial_index):
+    parallel = makeindex.build_index(processes=2)
+    # Compare the serialized index so the order of the
+    # commands and children has to match as well.
+    assert json.dumps(parallel) == json.dumps(serial_index)
+
+
+def test_index_has_fingerprint_for_every_service(serial_index):
+    fingerprints = serial_index['fingerprints']
+    assert sorted(fingerprints) == sorted(serial_index['aws']['commands'])
+    assert fingerprints['ec2'] != fingerprints['s3']
+
+
+def test_unchanged_services_are_copied_from_previous_index(serial_index):
+    previous = copy.deepcopy(serial_index)
+    # The fingerprint matches, so this is copied as is.
+    previous['aws']['children']['ec2'] = {'copied': True}
+    # The fingerprint doesn't match, so this is indexed again.
+    previous['fingerprints']['sts'] = 'changed'
+    previous['aws']['children']['sts'] = {'copied': True}
+    index = makeindex.build_index(processes=1, previous_index=previous)
+    assert index['aws']['children']['ec2'] == {'copied': True}
+    assert index['aws']['children']['sts'] == \
+        serial_index['aws']['children']['sts']
+    assert index['fingerprints'] == serial_index['fingerprints']
+
+
+def test_background_builder_adds_services_as_they_are_indexed(
+        serial_index, tmpdir):
+    output_filename = tmpdir.join('completions.json').strpath
+    # Every service is copied from the previous index, so this is quick.
+    builder = makeindex.BackgroundIndexBuilder(
+        output_filename, load_previous_index=lambda: serial_index)
+    root = builder.index_data['aws']
+    assert root.commands == serial_index['aws']['commands']
+    assert len(root.children) == 0
+    assert builder.index_data['lexicon'].subcommands == []
+    updates = []
+    builder.on_update = lambda: updates.append(len(root.children))
+    builder.start().join()
+    services = len(serial_index['aws']['commands'])
+    assert updates == list(range(1, services + 1)) + [services]
+    assert builder.done
+    assert not builder.failed
+    assert builder.progress == (services, services)
+    assert root.children['ec2'] == serial_index['aws']['children']['ec2']
+    assert builder.index_data['lexicon'].subcommands
+    with open(output_filename) as f:
+        contents = completion.validate_index(f.read())
+    assert contents == json.dumps(serial_index)
+    # Nothing is kept around once the index is built.
+    assert builder._help_command is None
+    assert builder._load_previous_index is None
+
+
+def test_background_builder_indexes_services_in_another_process(
+        serial_index, tmpdir):
+    output_filename = tmpdir.join('completions.json').strpath
+    previous = copy.deepcopy(serial_index)
+    previous['fingerprints']['sts'] = 'changed'
+    previous['aws']['children']['sts'] = {'copied': True}
+    builder = makeindex.BackgroundIndexBuilder(
+        output_filename, processes=1, load_previous_index=lambda: previous)
+    builder.start().join()
+    assert not builder.failed
+    assert builder._process.returncode == 0
+    assert builder.index_data['aws'].children['sts'] == \
+        serial_index['aws']['children']['sts']
+    with open(output_filename) as f:
+        contents = completion.validate_index(f.read())
+    assert contents == json.dumps(serial_index)
+
+
+def test_background_builder_fails_if_indexing_process_fails(
+        serial_index, tmpdir, monkeypatch):
+    output_filename = tmpdir.join('completions.json').strpath
+    previous = copy.deepcopy(serial_index)
+    previous['fingerprints']['sts'] = 'changed'
+    monkeypatch.setattr(
+        makeindex, '_index_services_command',
+        lambda names, processes: [
+            sys.executable, '-c', 'import sys; sys.exit("Unable to index.")'])
+    builder = makeindex.BackgroundIndexBuilder(
+        output_filename, load_previous_index=lambda: previous)
+    builder.start().join()
+    assert builder.failed
+    assert 'sts' not in builder.index_data['aws'].children
+    assert builder.index_data['aws'].children['ec2'] == \
+        serial_index['aws']['children']['ec2']
+    assert not tmpdir.join('completions.json').check()
+
+
+def test_background_builder_reports_failure(tmpdir, monkeypatch):
+    def fail(help_command):
+        raise RuntimeError("Unable to fingerprint.")
+    monkeypatch.setattr(makeindex, 'service_fingerprints', fail)
+    builder = makeindex.BackgroundIndexBuilder(
+        tmpdir.join('completions.json').strpath)
+    updates = []
+    builder.on_update = lambda: updates.append(builder.done)
+    builder.start().join()
+    assert builder.done
+    assert builder.failed
+    assert updates == [True]
+    assert not tmpdir.join('completions.json').check()
+
+
+def test_can_write_shared_index(serial_index, tmpdir):
+    shared_dir = tmpdir.mkdir('shared')
+    # Copying every service from a previous index keeps this quick.
+    shared_dir.join('completions-0.0.1.json').write(
+        completion.dumps_index(serial_index, '0.0.1'))
+    makeindex.main(['--output-dir', shared_dir.strpath, '--no-docs'])
+    version = awscli.__version__
+    assert shared_dir.join('completions-%s.json' % version).check()
+    assert shared_dir.join('completions-%s.bin' % version).check()
+    cache_dir = tmpdir.join('cache')
+    indexer = completion.CompletionIndex(
+        cache_dir=cache_dir.strpath, search_dirs=[shared_dir.strpath])
+    index_data = indexer.load_index_data(version)
+    assert index_data['aws']['children']['ec2'] == \
+        serial_index['aws']['children']['ec2']
+    # Nothing had to be written to the user's cache.
+    assert not cache_dir.check()
+
+
+class SomeServices(object):
+    # The CLI's help command, with only some of its services.
+    def __init__(self, names):
+        help_command = awscli.clidriver.create_clidriver()\
+            .create_help_command()
+        self.command_table = dict(
+            (name, help_command.command_table[name]) for name in names)
+
+
+def test_parallel_docs_match_serial_docs():
+    help_command = SomeServices(['sts', 'pricing'])
+    serial = {}
+    makeindex.do_write_doc_index(serial, help_command,
+                                 close_db_on_finish=False)
+    parallel = {}
+    makeindex.do_write_doc_index(parallel, help_command,
+                                 close_db_on_finish=False, processes=2)
+    assert 'aws.sts.get-caller-identity#description' in parallel
+    assert parallel == serial
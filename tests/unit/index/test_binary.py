@@ -0,0 +1,269 @@
+import os
+import gc
+import copy
+import json
+
+import pytest
+
+from awsshell.autocomplete import AWSCLIModelCompleter
+from awsshell.index import binary
+from awsshell.index.records import ArgumentMetadata, IndexNode, Lexicon
+from awsshell.utils import FSLayer
+
+
+def metadata(type_name='string', required=False, example=''):
+    return {'required': required, 'type_name': type_name,
+            'minidoc': 'The %s.' % type_name, 'example': example,
+            'api_name': 'Foo'}
+
+
+@pytest.fixture
+def index_data():
+    return {
+        'aws': {
+            'arguments': ['--debug', '--region'],
+            'argument_metadata': {
+                '--debug': metadata('boolean'),
+                '--region': metadata(),
+            },
+            'commands': ['ec2', 's3api'],
+            'children': {
+                'ec2': {
+                    'arguments': [],
+                    'argument_metadata': {},
+                    'commands': ['create-tags'],
+                    'children': {
+                        'create-tags': {
+                            'arguments': ['--resources', '--tags'],
+                            'argument_metadata': {
+                                '--resources': metadata('list', True),
+                                '--tags': metadata('list', True,
+                                                   u'Key=\u2713,Value=b'),
+                            },
+                            'commands': [],
+                            'children': {},
+                        },
+                    },
+                },
+                's3api': {
+                    'arguments': [],
+                    'argument_metadata': {},
+                    'commands': [],
+                    'children': {},
+                },
+            },
+        },
+    }
+
+
+def test_round_trip(index_data):
+    loaded = binary.loads(binary.dumps(index_data))
+    assert loaded['aws'] == index_data['aws']
+    assert list(loaded['aws']['children']) == list(
+        index_data['aws']['children'])
+
+
+def test_lexicon_loaded_without_services(index_data):
+    loaded = binary.loads(binary.dumps(index_data))
+    assert loaded['lexicon'] == Lexicon.from_index(index_data['aws'])
+    assert loaded['aws']['children']._loaded == {}
+
+
+def test_services_are_decoded_on_first_access(index_data):
+    loaded = binary.loads(binary.dumps(index_data))
+    children = loaded['aws']['children']
+    assert 'ec2' in children
+    assert children._loaded == {}
+    ec2 = children['ec2']
+    assert list(children._loaded) == ['ec2']
+    assert children['ec2'] is ec2
+    assert children.get('iam') is None
+
+
+def test_root_does_not_read_service_records(index_data):
+    data = binary.dumps(index_data)
+    children = binary.loads(data)['aws']['children']
+    offset, length, _ = children._locations['ec2']
+    corrupted = data[:offset] + b'\x00' * length + data[offset + length:]
+    corrupt_services = []
+    loaded = binary.loads(
+        corrupted, on_corrupt=lambda: corrupt_services.append('corrupt'))
+    assert loaded['aws']['commands'] == ['ec2', 's3api']
+    assert loaded['aws']['children']['s3api'] == \
+        index_data['aws']['children']['s3api']
+    assert corrupt_services == []
+    # A corrupt service is treated as missing.
+    assert loaded['aws']['children'].get('ec2') is None
+    assert 'ec2' not in loaded['aws']['children']
+    assert list(loaded['aws']['children']) == ['s3api']
+    assert corrupt_services == ['corrupt']
+
+
+def test_changed_bytes_in_service_record_are_detected(index_data):
+    data = binary.dumps(index_data)
+    offset, length, _ = binary.loads(data)['aws']['children']._locations[
+        's3api']
+    # Flip a few bytes in the middle of the record, which may still
+    # be a valid marshal record.
+    middle = offset + length // 2
+    corrupted = data[:middle] + bytes(bytearray(
+        b ^ 0xff for b in bytearray(data[middle:middle + 4]))) + \
+        data[middle + 4:]
+    children = binary.loads(corrupted)['aws']['children']
+    assert children.get('s3api') is None
+    assert children['ec2'] == index_data['aws']['children']['ec2']
+
+
+def test_corrupt_root_record_raises_error(index_data):
+    data = binary.dumps(index_data)
+    corrupted = data[:-5] + b'\x00' + data[-4:]
+    with pytest.raises(binary.IndexFormatError):
+        binary.loads(corrupted)
+
+
+def test_can_load_memory_mapped_file(index_data, tmpdir):
+    filename = os.path.join(str(tmpdir), 'completions.bin')
+    fslayer = FSLayer()
+    fslayer.write_file_contents(filename, binary.dumps(index_data),
+                                binary=True)
+    contents = fslayer.map_file(filename)
+    try:
+        assert binary.loads(contents)['aws'] == index_data['aws']
+    finally:
+        contents.close()
+
+
+def test_completer_only_loads_services_that_are_used(index_data):
+    loaded = binary.loads(binary.dumps(index_data))
+    children = loaded['aws']['children']
+    completer = AWSCLIModelCompleter(loaded)
+    assert completer.autocomplete('e') == ['ec2']
+    assert completer.autocomplete('ec2 create-tags --t') == ['--tags']
+    assert list(children._loaded) == ['ec2']
+
+
+def test_strings_and_metadata_are_shared(index_data):
+    s3api = index_data['aws']['children']['s3api']
+    s3api['commands'].append('put-object-tagging')
+    s3api['children']['put-object-tagging'] = copy.deepcopy(
+        index_data['aws']['children']['ec2']['children']['create-tags'])
+    loaded = binary.loads(binary.dumps(index_data))
+    ec2 = loaded['aws']['children']['ec2']
+    s3api = loaded['aws']['children']['s3api']
+    ec2_args = ec2['children']['create-tags']['argument_metadata']
+    s3_args = s3api['children']['put-object-tagging']['argument_metadata']
+    assert ec2_args['--resources'] is s3_args['--resources']
+    assert ec2_args['--tags'] is s3_args['--tags']
+    assert ec2_args['--tags'].type_name is ec2_args['--resources'].type_name
+    assert ec2['children']['create-tags']['arguments'][0] is \
+        s3api['children']['put-object-tagging']['arguments'][0]
+
+
+def test_loads_index_nodes(index_data):
+    loaded = binary.loads(binary.dumps(index_data))
+    root = loaded['aws']
+    assert isinstance(root, IndexNode)
+    create_tags = root.children['ec2'].children['create-tags']
+    assert isinstance(create_tags, IndexNode)
+    assert create_tags.arguments == ['--resources', '--tags']
+
+
+def test_argument_metadata_is_immutable(index_data):
+    loaded = binary.loads(binary.dumps(index_data))
+    metadata = loaded['aws']['argument_metadata']['--debug']
+    assert isinstance(metadata, ArgumentMetadata)
+    with pytest.raises(TypeError):
+        metadata['required'] = True
+
+
+def create_large_index(num_services=20, num_operations=50):
+    # Operations with many common arguments, similar to the real index.
+    common_args = ['--dry-run', '--cli-input-json', '--generate-cli-skeleton']
+    index = {'aws': {'arguments': [], 'argument_metadata': {},
+                     'commands': [], 'children': {}}}
+    for i in range(num_services):
+        service = {'arguments': [], 'argument_metadata': {},
+                   'commands': [], 'children': {}}
+        for j in range(num_operations):
+            arguments = common_args + [
+                '--service-%s-arg-%s' % (i, k) for k in range(5)]
+            service['children']['operation-%s' % j] = {
+                'arguments': arguments,
+                'argument_metadata': dict(
+                    (arg, metadata()) for arg in arguments),
+                'commands': [],
+                'children': {},
+            }
+            service['commands'].append('operation-%s' % j)
+        index['aws']['children']['service-%s' % i] = service
+        index['aws']['commands'].append('service-%s' % i)
+    return index
+
+
+def measure_memory(load):
+    # Returns the loaded value and the memory it's using, in bytes.
+    tracemalloc = pytest.importorskip('tracemalloc')
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        loaded = load()
+        gc.collect()
+        return loaded, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def test_loaded_index_uses_less_memory_than_json():
+    index_data = create_large_index()
+    json_contents = json.dumps(index_data)
+    binary_contents = binary.dumps(index_data)
+
+    def load_binary():
+        loaded = binary.loads(binary_contents)
+        for name in loaded['aws']['children']:
+            loaded['aws']['children'][name]
+        return loaded
+
+    from_json, json_memory = measure_memory(
+        lambda: json.loads(json_contents))
+    from_binary, binary_memory = measure_memory(load_binary)
+    assert from_binary['aws'] == from_json['aws']
+    # Even with every service loaded, sharing the strings and
+    # metadata should at least halve the memory used.
+    assert binary_memory < json_memory / 2
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'NOTINDEX' + b'\x00' * 32,
+])
+def test_invalid_data_raises_error(data):
+    with pytest.raises(binary.IndexFormatError):
+        binary.loads(data)
+
+
+def test_unsupported_version_raises_error(index_data):
+    data = binary.dumps(index_data)
+    header = list(binary.HEADER.unpack(data[:binary.HEADER.size]))
+    header[1] = binary.FORMAT_VERSION + 1
+    with pytest.raises(binary.IndexFormatError):
+        binary.loads(binary.HEADER.pack(*header) + data[binary.HEADER.size:])
+
+
+def test_truncated_data_raises_error(index_data):
+    data = binary.dumps(index_data)
+    with pytest.raises(binary.IndexFormatError):
+        binary.loads(data[:-10])
+
+
+def test_trailing_data_raises_error(index_data):
+    data = binary.dumps(index_data)
+    with pytest.raises(binary.IndexFormatError):
+        binary.loads(data + b'\x00')
+
+
+def test_unsupported_metadata_raises_error(index_data):
+    index_data['aws']['argument_metadata']['--debug'] = {'required': True}
+    with pytest.raises(binary.IndexFormatError):
+        binary.dumps(index_data)
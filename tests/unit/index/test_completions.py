@@ -1,9 +1,31 @@
+import json
+
 from tests import unittest
 
+from awsshell.autocomplete import AWSCLIModelCompleter
+from awsshell.index import binary
 from awsshell.index import completion
+from awsshell.index.records import IndexNode
 from awsshell.utils import InMemoryFSLayer
 
 
+INDEX_DATA = {
+    'aws': {
+        'arguments': ['--debug'],
+        'argument_metadata': {
+            '--debug': {'required': False, 'type_name': 'boolean',
+                        'minidoc': 'Debug logging.', 'example': '',
+                        'api_name': ''},
+        },
+        'commands': ['ec2'],
+        'children': {
+            'ec2': {'arguments': [], 'argument_metadata': {},
+                    'commands': [], 'children': {}},
+        },
+    },
+}
+
+
 class TestCompletionIndex(unittest.TestCase):
     def setUp(self):
         # filename -> file content
@@ -13,7 +35,8 @@ class TestCompletionIndex(unittest.TestCase):
     def test_can_load_index(self):
         c = completion.CompletionIndex(cache_dir='/tmp/cache',
                                        fslayer=self.fslayer)
-        self.files['/tmp/cache/completions-1.9.1.json'] = '{}'
+        self.files['/tmp/cache/completions-1.9.1.json'] = \
+            completion.dumps_index({}, '1.9.1')
         try:
             c.load_index('1.9.1')
         except completion.IndexLoadError as e:
@@ -25,3 +48,181 @@ class TestCompletionIndex(unittest.TestCase):
                                        fslayer=self.fslayer)
         with self.assertRaises(completion.IndexLoadError):
             c.load_index('1.9.1')
+
+    def test_load_index_data_writes_binary_index(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        self.files['/tmp/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')
+        index_data = c.load_index_data('1.9.1')
+        self.assertIsInstance(index_data['aws'], IndexNode)
+        self.assertEqual(index_data['aws'], INDEX_DATA['aws'])
+        self.assertIn('/tmp/cache/completions-1.9.1.bin', self.files)
+        # The binary index is used from now on.
+        del self.files['/tmp/cache/completions-1.9.1.json']
+        from_binary = c.load_index_data('1.9.1')
+        self.assertEqual(from_binary['aws'], INDEX_DATA['aws'])
+        self.assertEqual(from_binary['lexicon'], index_data['lexicon'])
+
+    def test_invalid_binary_index_falls_back_to_json(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        self.files['/tmp/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')
+        self.files['/tmp/cache/completions-1.9.1.bin'] = b'invalid'
+        self.assertEqual(c.load_index_data('1.9.1')['aws'], INDEX_DATA['aws'])
+        # The invalid binary index is replaced.
+        binary_index = self.files['/tmp/cache/completions-1.9.1.bin']
+        self.assertEqual(binary.loads(binary_index)['aws'], INDEX_DATA['aws'])
+
+    def test_corrupt_service_in_binary_index_is_missing(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        self.files['/tmp/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')
+        data = binary.dumps(INDEX_DATA)
+        offset, length, _ = binary.loads(
+            data)['aws']['children']._locations['ec2']
+        self.files['/tmp/cache/completions-1.9.1.bin'] = (
+            data[:offset] + b'\x00' * length + data[offset + length:])
+        completer = AWSCLIModelCompleter(c.load_index_data('1.9.1'))
+        # The service is skipped rather than raising an error.
+        completer.autocomplete('ec2 ')
+        self.assertEqual(completer.cmd_path, ['aws'])
+        # The corrupt binary index is removed, and written
+        # again from the JSON index on the next run.
+        self.assertNotIn('/tmp/cache/completions-1.9.1.bin', self.files)
+        self.assertEqual(c.load_index_data('1.9.1')['aws'], INDEX_DATA['aws'])
+        self.assertIn('/tmp/cache/completions-1.9.1.bin', self.files)
+
+    def test_load_index_data_for_missing_index_raises_error(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        with self.assertRaises(completion.IndexLoadError):
+            c.load_index_data('1.9.1')
+
+    def test_load_previous_index_data(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        previous = dict(INDEX_DATA, fingerprints={'ec2': 'abc'})
+        self.files['/tmp/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(previous, '1.9.1')
+        # Newer, but doesn't have fingerprints.
+        self.files['/tmp/cache/completions-1.9.2.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.2')
+        # Corrupt.
+        self.files['/tmp/cache/completions-1.9.3.json'] = \
+            completion.dumps_index(previous, '1.9.3')[:-10]
+        # The current version is never used.
+        self.files['/tmp/cache/completions-1.10.0.json'] = \
+            completion.dumps_index(previous, '1.10.0')
+        self.assertEqual(c.load_previous_index_data('1.10.0'), previous)
+
+    def test_no_previous_index_data(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        self.assertIsNone(c.load_previous_index_data('1.10.0'))
+
+    def test_invalid_index_raises_validation_error(self):
+        c = completion.CompletionIndex(cache_dir='/tmp/cache',
+                                       fslayer=self.fslayer)
+        # Truncated while it was being written.
+        self.files['/tmp/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')[:-1]
+        with self.assertRaises(completion.IndexValidationError):
+            c.load_index('1.9.1')
+        with self.assertRaises(completion.IndexValidationError):
+            c.load_index_data('1.9.1')
+        # Nothing was written from the invalid index.
+        self.assertNotIn('/tmp/cache/completions-1.9.1.bin', self.files)
+
+
+class TestSharedIndex(unittest.TestCase):
+    def setUp(self):
+        self.files = {}
+        self.fslayer = InMemoryFSLayer(self.files)
+        self.completion_index = completion.CompletionIndex(
+            cache_dir='/home/cache', fslayer=self.fslayer,
+            search_dirs=['/shared/first', '/shared/second'])
+
+    def test_shared_index_is_used_before_cache(self):
+        shared = dict(INDEX_DATA, shared=True)
+        self.files['/shared/second/completions-1.9.1.json'] = \
+            completion.dumps_index(shared, '1.9.1')
+        self.files['/home/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')
+        index_data = self.completion_index.load_index_data('1.9.1')
+        self.assertTrue(index_data['shared'])
+        self.assertEqual(json.loads(self.completion_index.load_index(
+            '1.9.1')), shared)
+        # Shared directories are read only.
+        self.assertEqual(sorted(self.files), [
+            '/home/cache/completions-1.9.1.json',
+            '/shared/second/completions-1.9.1.json'])
+
+    def test_shared_binary_index_is_used(self):
+        self.files['/shared/first/completions-1.9.1.bin'] = binary.dumps(
+            INDEX_DATA)
+        index_data = self.completion_index.load_index_data('1.9.1')
+        self.assertEqual(index_data['aws'], INDEX_DATA['aws'])
+
+    def test_falls_back_to_cache(self):
+        # The shared index is for another version of the CLI.
+        self.files['/shared/first/completions-1.9.0.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.0')
+        # This one is corrupt.
+        self.files['/shared/second/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')[:-1]
+        self.files['/home/cache/completions-1.9.1.json'] = \
+            completion.dumps_index(INDEX_DATA, '1.9.1')
+        index_data = self.completion_index.load_index_data('1.9.1')
+        self.assertEqual(index_data['aws'], INDEX_DATA['aws'])
+        self.assertIn('/home/cache/completions-1.9.1.bin', self.files)
+
+    def test_missing_index_raises_error(self):
+        with self.assertRaises(completion.IndexLoadError):
+            self.completion_index.load_index_data('1.9.1')
+
+    def test_previous_index_from_shared_dir(self):
+        previous = dict(INDEX_DATA, fingerprints={'ec2': 'abc'})
+        self.files['/shared/second/completions-1.9.0.json'] = \
+            completion.dumps_index(previous, '1.9.0')
+        self.assertEqual(
+            self.completion_index.load_previous_index_data('1.9.1'),
+            previous)
+
+
+class TestValidateIndex(unittest.TestCase):
+    def test_can_round_trip_index(self):
+        contents = completion.dumps_index(INDEX_DATA, '1.9.1')
+        self.assertTrue(contents.startswith('aws-shell-index 1 1.9.1 '))
+        self.assertEqual(
+            json.loads(completion.validate_index(contents, '1.9.1')),
+            INDEX_DATA)
+        # Any version is accepted if one isn't given.
+        self.assertEqual(
+            json.loads(completion.validate_index(contents)), INDEX_DATA)
+
+    def assert_invalid(self, contents, version_string='1.9.1'):
+        with self.assertRaises(completion.IndexValidationError):
+            completion.validate_index(contents, version_string)
+
+    def test_no_header(self):
+        self.assert_invalid(json.dumps(INDEX_DATA))
+        self.assert_invalid('')
+
+    def test_wrong_cli_version(self):
+        self.assert_invalid(completion.dumps_index(INDEX_DATA, '1.9.0'))
+
+    def test_wrong_format_version(self):
+        contents = completion.dumps_index(INDEX_DATA, '1.9.1')
+        self.assert_invalid(contents.replace(
+            'aws-shell-index 1 ', 'aws-shell-index 2 ', 1))
+
+    def test_wrong_length(self):
+        contents = completion.dumps_index(INDEX_DATA, '1.9.1')
+        self.assert_invalid(contents + ' ')
+
+    def test_wrong_checksum(self):
+        contents = completion.dumps_index(INDEX_DATA, '1.9.1')
+        self.assert_invalid(contents.replace('--debug', '--dxbug'))
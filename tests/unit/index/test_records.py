@@ -0,0 +1,67 @@
+import pytest
+
+from awsshell.index.records import ArgumentMetadata, IndexNode
+
+
+@pytest.fixture
+def metadata():
+    return ArgumentMetadata(required=True, type_name='list',
+                            minidoc='The resources.', example='',
+                            api_name='Resources')
+
+
+def test_can_access_as_attributes_or_keys(metadata):
+    assert metadata.required is True
+    assert metadata['type_name'] == 'list'
+    assert metadata.get('api_name') == 'Resources'
+    assert metadata.get('unknown') is None
+    assert 'minidoc' in metadata
+    with pytest.raises(KeyError):
+        metadata['unknown']
+
+
+def test_equal_to_dict(metadata):
+    expected = {'required': True, 'type_name': 'list',
+                'minidoc': 'The resources.', 'example': '',
+                'api_name': 'Resources'}
+    assert metadata == expected
+    assert dict(metadata) == expected
+    assert len(metadata) == 5
+
+
+def test_is_immutable(metadata):
+    with pytest.raises(AttributeError):
+        metadata.required = False
+    with pytest.raises(TypeError):
+        metadata['required'] = False
+
+
+def test_index_node_from_dict():
+    node = IndexNode.from_dict({
+        'arguments': ['--region'],
+        'commands': ['ec2'],
+        'children': {'ec2': {'commands': ['create-tags']}},
+    })
+    assert node.arguments == ['--region']
+    assert node.argument_metadata == {}
+    assert node.children['ec2'].commands == ['create-tags']
+    assert node.children['ec2'].children == {}
+    assert IndexNode.from_dict(node) is node
+
+
+def test_index_node_supports_dict_lookups():
+    data = {'arguments': [], 'argument_metadata': {}, 'commands': ['ec2'],
+            'children': {'ec2': {'arguments': [], 'argument_metadata': {},
+                                 'commands': [], 'children': {}}}}
+    node = IndexNode.from_dict(data)
+    assert node['commands'] == ['ec2']
+    assert node.get('children')['ec2']['commands'] == []
+    assert node == data
+    with pytest.raises(KeyError):
+        node['unknown']
+
+
+def test_index_node_has_no_dict():
+    node = IndexNode([], {}, [], {})
+    with pytest.raises(AttributeError):
+        node.unknown = 'foo'
@@ -0,0 +1,106 @@
+import pytest
+
+from awsshell.autocomplete import AWSCLIModelCompleter
+from awsshell.index import completion
+from awsshell.index.registry import IndexRegistry
+from awsshell.lexer import load_completions
+from awsshell.utils import InMemoryFSLayer
+
+
+INDEX_DATA = {
+    'aws': {
+        'arguments': ['--debug'],
+        'argument_metadata': {},
+        'commands': ['ec2'],
+        'children': {
+            'ec2': {
+                'arguments': [],
+                'argument_metadata': {},
+                'commands': ['create-tags'],
+                'children': {
+                    'create-tags': {
+                        'arguments': ['--resources'],
+                        'argument_metadata': {},
+                        'commands': [],
+                        'children': {},
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+class CountingFSLayer(InMemoryFSLayer):
+    def __init__(self, file_mapping):
+        super(CountingFSLayer, self).__init__(file_mapping)
+        self.reads = []
+
+    def file_contents(self, filename, binary=False):
+        self.reads.append(filename)
+        return super(CountingFSLayer, self).file_contents(filename, binary)
+
+    def map_file(self, filename):
+        self.reads.append(filename)
+        return super(CountingFSLayer, self).file_contents(filename, True)
+
+
+@pytest.fixture
+def fslayer():
+    return CountingFSLayer({
+        '/cache/completions-1.9.1.json': completion.dumps_index(
+            INDEX_DATA, '1.9.1'),
+    })
+
+
+def create_registry(fslayer):
+    return IndexRegistry(
+        completion.CompletionIndex(cache_dir='/cache', fslayer=fslayer,
+                                   search_dirs=[]),
+        version_string='1.9.1')
+
+
+def test_index_is_loaded_once(fslayer):
+    registry = create_registry(fslayer)
+    assert fslayer.reads == []
+    index_data = registry.get_index()
+    assert registry.get_index() is index_data
+    assert fslayer.reads == ['/cache/completions-1.9.1.json']
+
+
+def test_index_shared_by_lexer_and_completer(fslayer):
+    registry = create_registry(fslayer)
+    completer = AWSCLIModelCompleter(registry.get_index())
+    lexer_completions = load_completions(registry)
+    assert fslayer.reads == ['/cache/completions-1.9.1.json']
+    assert lexer_completions.commands == ['ec2']
+    assert lexer_completions.subcommands == ['create-tags']
+    assert lexer_completions.args_opts == set(['--resources'])
+    assert completer.autocomplete('ec2 c') == ['create-tags']
+
+
+def test_binary_index_used_by_new_registry(fslayer):
+    create_registry(fslayer).get_index()
+    fslayer.reads = []
+    registry = create_registry(fslayer)
+    load_completions(registry)
+    assert fslayer.reads == ['/cache/completions-1.9.1.bin']
+
+
+def test_load_error_is_not_cached():
+    fslayer = CountingFSLayer({})
+    registry = create_registry(fslayer)
+    with pytest.raises(completion.IndexLoadError):
+        registry.get_index()
+    assert load_completions(registry).commands == []
+    fslayer.write_file_contents('/cache/completions-1.9.1.json',
+                                completion.dumps_index(INDEX_DATA, '1.9.1'))
+    assert registry.get_index()['aws']['commands'] == ['ec2']
+
+
+def test_can_set_index(fslayer):
+    registry = create_registry(fslayer)
+    index_data = {'aws': INDEX_DATA['aws']}
+    registry.set_index(index_data)
+    assert registry.get_index() is index_data
+    assert fslayer.reads == []
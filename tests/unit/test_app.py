@@ -183,3 +183,14 @@ def test_exit_dot_command_exits_shell():
     # see the .quit command, we immediately exit and stop prompting
     # for more shell commands.
     assert mock_prompter.run.call_count == 1
+
+
+def test_index_progress():
+    builder = mock.Mock(done=False, progress=(1, 2))
+    shell = app.AWSShell(mock.Mock(), mock.Mock(), mock.Mock(),
+                         index_builder=builder)
+    assert shell.index_progress() == (1, 2)
+    builder.done = True
+    assert shell.index_progress() is None
+    shell.index_builder = None
+    assert shell.index_progress() is None
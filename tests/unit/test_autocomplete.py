@@ -1,5 +1,9 @@
+import threading
+
 import pytest
 from awsshell.autocomplete import AWSCLIModelCompleter
+from awsshell.fuzzy import fuzzy_search
+from awsshell.index.records import IndexNode
 
 @pytest.fixture
 def index_data():
@@ -119,11 +123,53 @@ def test_reset_after_subcommand_completion(index_data):
 
 
 def test_backspace_should_complete_previous_command(index_data):
-    pass
+    index_data['aws']['commands'] = ['ec2', 's3']
+    index_data['aws']['children'] = {
+        'ec2': {
+            'arguments': [],
+            'commands': ['copy-image', 'copy-snapshot', 'other'],
+            'children': {},
+        }
+    }
+    completer = AWSCLIModelCompleter(index_data)
+    c = completer.autocomplete
+    c('ec2 ')
+    c('ec2 c')
+    # The user hits backspace and is back to the ec2 context.
+    assert c('ec2 ') == ['copy-image', 'copy-snapshot', 'other']
+    # One more backspace and we're completing the service name again.
+    assert c('ec2') == ['ec2']
+    assert completer.cmd_path == ['aws']
 
 
 def test_can_handle_entire_word_deleted(index_data):
-    pass
+    index_data['aws']['commands'] = ['ec2']
+    index_data['aws']['children'] = {
+        'ec2': {
+            'commands': ['create-tags', 'describe-instances'],
+            'argument_metadata': {},
+            'arguments': [],
+            'children': {
+                'create-tags': {
+                    'commands': [],
+                    'argument_metadata': {
+                        '--resources': {'example': '', 'minidoc': 'foo'},
+                    },
+                    'arguments': ['--resources'],
+                    'children': {},
+                }
+            }
+        }
+    }
+    completer = AWSCLIModelCompleter(index_data)
+    c = completer.autocomplete
+    c('ec2 create-tags --resources ')
+    assert completer.cmd_path == ['aws', 'ec2', 'create-tags']
+    assert completer.last_option == '--resources'
+    # The user deletes the last two words (e.g. ctrl-w).
+    assert c('ec2 ') == ['create-tags', 'describe-instances']
+    assert completer.cmd_path == ['aws', 'ec2']
+    assert completer.last_option == ''
 
 
 def test_can_handle_entire_line_deleted(index_data):
@@ -380,3 +426,245 @@ def test_global_arg_metadata_property(index_data):
     }
     completer = AWSCLIModelCompleter(index_data)
     assert '--global1' in completer.global_arg_metadata
+
+
+def test_can_handle_edit_in_middle_of_line(index_data):
+    index_data['aws']['commands'] = ['ec2', 'ecs']
+    index_data['aws']['children'] = {
+        'ec2': {
+            'commands': ['describe-instances'],
+            'argument_metadata': {},
+            'arguments': [],
+            'children': {},
+        },
+        'ecs': {
+            'commands': ['describe-clusters', 'list-clusters'],
+            'argument_metadata': {},
+            'arguments': [],
+            'children': {},
+        }
+    }
+    completer = AWSCLIModelCompleter(index_data)
+    c = completer.autocomplete
+    c('ec2 desc')
+    assert completer.cmd_path == ['aws', 'ec2']
+    # The user moves the cursor back and changes ec2 -> ecs.
+    assert c('ecs desc') == ['describe-clusters']
+    assert completer.cmd_path == ['aws', 'ecs']
+
+
+def test_only_reparses_tokens_after_edit(index_data):
+    index_data['aws']['commands'] = ['ec2']
+    index_data['aws']['children'] = {
+        'ec2': {
+            'commands': ['run-instances'],
+            'argument_metadata': {},
+            'arguments': [],
+            'children': {
+                'run-instances': {
+                    'commands': [],
+                    'argument_metadata': {},
+                    'arguments': [],
+                    'children': {},
+                }
+            },
+        }
+    }
+    completer = AWSCLIModelCompleter(index_data)
+    consumed = []
+    original_consume = completer._consume_token
+
+    def record_consume(context, word, end):
+        consumed.append(word)
+        return original_consume(context, word, end)
+
+    completer._consume_token = record_consume
+    # The user pastes a long line.
+    line = 'ec2 run-instances ' + ' '.join('v%s' % i for i in range(100))
+    completer.autocomplete(line + ' ')
+    assert len(consumed) == 102
+    # Backspacing over the last word only needs to revisit
+    # that one token.
+    del consumed[:]
+    completer.autocomplete(line)
+    completer.autocomplete(line[:-1])
+    assert consumed == []
+    completer.autocomplete(line + ' --foo ')
+    assert consumed == ['v99', '--foo']
+    assert completer.cmd_path == ['aws', 'ec2', 'run-instances']
+
+
+def test_finds_commands_added_to_the_index(index_data):
+    index_data['aws']['commands'] = ['ec2']
+    completer = AWSCLIModelCompleter(index_data)
+    # ec2 hasn't been indexed yet, so we stay at the root.
+    completer.autocomplete('ec2 ')
+    assert completer.autocomplete('ec2 ru') == []
+    assert completer.cmd_path == ['aws']
+    completer._root.children['ec2'] = IndexNode(
+        arguments=[], argument_metadata={},
+        commands=['run-instances'], children={})
+    completer.index_changed()
+    assert completer.autocomplete('ec2 ru') == ['run-instances']
+    assert completer.cmd_path == ['aws', 'ec2']
+
+
+@pytest.fixture
+def ec2_index_data(index_data):
+    index_data['aws']['arguments'] = ['--region']
+    index_data['aws']['commands'] = ['ec2', 's3']
+    index_data['aws']['children'] = {
+        'ec2': {
+            'commands': ['create-tags', 'describe-instances'],
+            'argument_metadata': {},
+            'arguments': [],
+            'children': {
+                'create-tags': {
+                    'commands': [],
+                    'argument_metadata': {
+                        '--resources': {'example': '', 'minidoc': 'foo'},
+                        '--tags': {'example': 'Key=k,Value=v',
+                                   'minidoc': 'bar'},
+                    },
+                    'arguments': ['--resources', '--tags'],
+                    'children': {},
+                }
+            }
+        }
+    }
+    return index_data
+
+
+def test_complete_does_not_change_state(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    result = completer.complete('ec2 create-tags --res')
+    assert result.completions == ['--resources']
+    assert result.cmd_path == ['aws', 'ec2', 'create-tags']
+    assert result.word == '--res'
+    assert '--tags' in result.arg_metadata
+    assert completer.cmd_path == ['aws']
+    assert completer.last_option == ''
+
+
+def test_complete_matches_autocomplete(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    stateless = AWSCLIModelCompleter(ec2_index_data)
+    line = 'ec2 create-tags --resources i-123 --tags '
+    for i in range(len(line) + 1):
+        expected = completer.autocomplete(line[:i])
+        result = stateless.complete(line[:i])
+        assert result.completions == expected
+        assert result.cmd_path == completer.cmd_path
+        assert result.last_option == completer.last_option
+
+
+def test_complete_only_uses_text_before_cursor(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    result = completer.complete('ec2 describe-instances', cursor=5)
+    assert result.completions == ['describe-instances']
+    assert result.cmd_path == ['aws', 'ec2']
+
+
+def test_complete_can_override_match_mode(index_data):
+    index_data['aws']['commands'] = ['foo', 'bar foo']
+    completer = AWSCLIModelCompleter(index_data)
+    assert completer.complete('fo', match_fuzzy=False).completions == ['foo']
+    assert completer.complete('fo').completions == ['foo', 'bar foo']
+
+
+def test_complete_can_be_called_from_multiple_threads(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    lines = ['ec2 create-tags --tags ', 'ec2 desc', 's', '--reg']
+    expected = dict((line, completer.complete(line)) for line in lines)
+    errors = []
+
+    def complete_lines():
+        for _ in range(200):
+            for line in lines:
+                if completer.complete(line) != expected[line]:
+                    errors.append(line)
+
+    threads = [threading.Thread(target=complete_lines) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_all_arg_metadata_includes_global_args(ec2_index_data):
+    ec2_index_data['aws']['argument_metadata'] = {
+        '--region': {'example': '', 'minidoc': 'region'},
+    }
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    completer.autocomplete('ec2 create-tags ')
+    assert sorted(completer.all_arg_metadata) == [
+        '--region', '--resources', '--tags']
+    # The local argument metadata is left alone.
+    assert sorted(completer.arg_metadata) == ['--resources', '--tags']
+
+
+def test_candidate_table_built_once_per_node(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    completer.autocomplete('ec2 create-tags --')
+    table = completer._candidate_table(completer._current)
+    assert completer.autocomplete('ec2 create-tags --t') == ['--tags']
+    assert completer._candidate_table(completer._current) is table
+    assert table.arguments == ('--resources', '--tags', '--region')
+
+
+def test_fuzzy_matches_narrowed_as_word_grows(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    c = completer.autocomplete
+    commands = ['create-tags', 'describe-instances']
+    for word in ['e', 'es', 'esc', 'es', 't', 'ta']:
+        assert c('ec2 ' + word) == fuzzy_search(word, commands)
+    args = ['--resources', '--tags', '--region']
+    for word in ['--', '--t', '--ta']:
+        assert c('ec2 create-tags ' + word) == fuzzy_search(word, args)
+
+
+def test_completions_are_cached(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    cache = completer.completion_cache
+    first = completer.autocomplete('ec2 desc')
+    assert (cache.hits, cache.misses) == (0, 1)
+    completer.reset()
+    assert completer.autocomplete('ec2 desc') == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Modifying the results doesn't modify the cache.
+    first.append('foo')
+    assert completer.autocomplete('ec2 desc') == ['describe-instances']
+
+
+def test_completion_cache_keyed_by_match_mode(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    assert completer.autocomplete('ec2 esc') == ['describe-instances']
+    completer.match_fuzzy = False
+    assert completer.autocomplete('ec2 esc') == []
+    completer.match_fuzzy = True
+    assert completer.autocomplete('ec2 esc') == ['describe-instances']
+
+
+def test_completion_cache_keyed_by_context(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data)
+    assert completer.autocomplete('ec2 create-tags --r') == fuzzy_search(
+        '--r', ['--resources', '--tags', '--region'])
+    completer.reset()
+    assert completer.autocomplete('ec2 --r') == ['--region']
+
+
+def test_completion_cache_is_bounded(ec2_index_data):
+    completer = AWSCLIModelCompleter(ec2_index_data, cache_size=2)
+    for word in ['c', 'cr', 'cre', 'crea']:
+        completer.autocomplete('ec2 ' + word)
+    assert len(completer.completion_cache) == 2
+
+
+def test_can_complete_index_nodes(ec2_index_data):
+    root = IndexNode.from_dict(ec2_index_data['aws'])
+    completer = AWSCLIModelCompleter({'aws': root})
+    assert completer.autocomplete('ec2 create-tags --t') == ['--tags']
+    assert completer.cmd_path == ['aws', 'ec2', 'create-tags']
+    assert completer.arg_metadata is \
+        root.children['ec2'].children['create-tags'].argument_metadata
@@ -0,0 +1,50 @@
+import awsshell
+
+
+class FakeProcess(object):
+    def __init__(self, returncode):
+        self.returncode = returncode
+        self.terminated = False
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.terminated = True
+        self.returncode = -15
+
+    def wait(self):
+        return self.returncode
+
+
+def test_doc_index_errors_are_written_to_log(tmpdir, monkeypatch):
+    log = tmpdir.join('shell', 'doc-index.log')
+    monkeypatch.setattr(awsshell, 'DOC_INDEX_LOG', str(log))
+    calls = []
+    monkeypatch.setattr(awsshell.subprocess, 'Popen',
+                        lambda args, **kwargs: calls.append(kwargs))
+    awsshell.start_doc_index_build('/cache/new.docs')
+    assert calls[0]['stderr'].name == str(log)
+    assert log.check(file=True)
+
+
+def test_running_doc_index_build_is_terminated(capsys):
+    process = FakeProcess(None)
+    awsshell.stop_doc_index_build(process)
+    assert process.terminated
+    assert capsys.readouterr()[0] == ''
+
+
+def test_failed_doc_index_build_is_reported(capsys, monkeypatch):
+    monkeypatch.setattr(awsshell, 'DOC_INDEX_LOG', '/shell/doc-index.log')
+    process = FakeProcess(1)
+    awsshell.stop_doc_index_build(process)
+    assert not process.terminated
+    output = capsys.readouterr()[0]
+    assert 'exit status 1' in output
+    assert '/shell/doc-index.log' in output
+
+
+def test_finished_doc_index_build_is_not_reported(capsys):
+    awsshell.stop_doc_index_build(FakeProcess(0))
+    assert capsys.readouterr()[0] == ''
@@ -1,3 +1,6 @@
+import sys
+import time
+
 from awsshell import docs
 from awsshell import db
 
@@ -12,3 +15,128 @@ def test_load_doc_db(tmpdir):
     filename = tmpdir.join("foo.db").strpath
     d = docs.load_doc_db(filename)
     assert isinstance(d, db.ConcurrentDBM)
+
+
+def test_find_shared_doc_index(tmpdir):
+    user_filename = tmpdir.join('user', '1.0-docs').strpath
+    incomplete = tmpdir.mkdir('incomplete')
+    d = db.ConcurrentDBM.create(incomplete.join('1.0-docs').strpath)
+    d.close()
+    not_a_db = tmpdir.mkdir('not-a-db')
+    not_a_db.join('1.0-docs').write('not a database')
+    complete = tmpdir.mkdir('complete')
+    d = db.ConcurrentDBM.create(complete.join('1.0-docs').strpath)
+    d['__complete__'] = 'true'
+    d.close()
+    missing = tmpdir.join('missing').strpath
+    assert docs.find_doc_index(user_filename, [
+        missing, incomplete.strpath, not_a_db.strpath, complete.strpath,
+    ]) == complete.join('1.0-docs').strpath
+    assert docs.find_doc_index(
+        user_filename, [missing, incomplete.strpath]) == user_filename
+
+
+def test_can_extract_doc_sections():
+    retriever = docs.DocRetriever({
+        'aws.ec2.start-instances#description': 'Starts instances.',
+        'aws.ec2.start-instances#--instance-ids': '--instance-ids (list)',
+    })
+    assert retriever.extract_description(
+        b'aws.ec2.start-instances') == 'Starts instances.'
+    assert retriever.extract_param(
+        b'aws.ec2.start-instances', '--instance-ids') == \
+        '--instance-ids (list)'
+    assert retriever.extract_description(b'aws.ec2.stop-instances') == ''
+
+
+def test_can_extract_docs_that_are_not_split():
+    retriever = docs.DocRetriever({
+        'aws.ec2.start-instances': (
+            'Starts instances.\nSYNOPSIS\nstart-instances\nOPTIONS\n'
+            '--instance-ids (list) The IDs.\n--dry-run (boolean)'),
+    })
+    assert retriever.extract_description(
+        b'aws.ec2.start-instances') == 'Starts instances.\n'
+    assert retriever.extract_param(
+        b'aws.ec2.start-instances', '--instance-ids') == \
+        '--instance-ids (list) The IDs.\n'
+
+
+class CountingDocIndex(dict):
+    def __init__(self, *args):
+        super(CountingDocIndex, self).__init__(*args)
+        self.reads = []
+
+    def __getitem__(self, key):
+        self.reads.append(key)
+        return super(CountingDocIndex, self).__getitem__(key)
+
+
+def test_docs_are_cached():
+    doc_index = CountingDocIndex({
+        'aws.ec2.start-instances#description': 'Starts instances.',
+        'aws.ec2.start-instances#--instance-ids': '--instance-ids (list)',
+    })
+    retriever = docs.DocRetriever(doc_index)
+    for _ in range(3):
+        retriever.extract_description(b'aws.ec2.start-instances')
+        retriever.extract_param(b'aws.ec2.start-instances', '--instance-ids')
+    assert doc_index.reads == [
+        'aws.ec2.start-instances#description',
+        'aws.ec2.start-instances#--instance-ids',
+    ]
+
+
+def test_missing_docs_are_not_cached():
+    doc_index = CountingDocIndex()
+    retriever = docs.DocRetriever(doc_index)
+    assert retriever.extract_description(b'aws.ec2') == ''
+    # The docs were written while the shell was running.
+    doc_index['aws.ec2#description'] = 'Amazon EC2.'
+    assert retriever.extract_description(b'aws.ec2') == 'Amazon EC2.'
+
+
+def test_cache_evicts_least_recently_used_docs():
+    size = sys.getsizeof('a' * 10)
+    cache = docs.DocCache(max_size=size * 2)
+    cache.put('a', 'a' * 10)
+    cache.put('b', 'b' * 10)
+    assert cache.get('a') == 'a' * 10
+    cache.put('c', 'c' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a' * 10
+    assert cache.get('c') == 'c' * 10
+    assert cache.size == size * 2
+
+
+def test_cache_skips_docs_larger_than_the_cache():
+    cache = docs.DocCache(max_size=10)
+    cache.put('a', 'a' * 100)
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_prefetches_descriptions_of_service(tmpdir):
+    filename = tmpdir.join('docs.db').strpath
+    d = db.ConcurrentDBM.create(filename)
+    d.update([
+        ('aws.ec2#description', 'Amazon EC2.'),
+        ('aws.ec2.run-instances#description', 'Runs instances.'),
+        ('aws.ec2.run-instances#--image-id', '--image-id (string)'),
+        ('aws.ec2.stop-instances#description', 'Stops instances.'),
+        ('aws.s3#description', 'Amazon S3.'),
+    ])
+    retriever = docs.DocRetriever(
+        d, open_doc_index=lambda: db.ConcurrentDBM.open(filename))
+    assert retriever.extract_description(b'aws.ec2') == 'Amazon EC2.'
+    cache = retriever._cache
+    for _ in range(100):
+        if 'aws.ec2.stop-instances#description' in cache:
+            break
+        time.sleep(0.05)
+    assert cache.get('aws.ec2.run-instances#description') == \
+        'Runs instances.'
+    assert cache.get('aws.ec2.stop-instances#description') == \
+        'Stops instances.'
+    assert 'aws.ec2.run-instances#--image-id' not in cache
+    assert 'aws.s3#description' not in cache
@@ -1,5 +1,7 @@
 import pytest
-from awsshell.fuzzy import fuzzy_search
+from awsshell import fuzzy
+from awsshell.fuzzy import fuzzy_search, calculate_score
+from awsshell.fuzzy import FuzzySession, FuzzyCorpus, VectorizedCorpus
 
 
 @pytest.mark.parametrize("search,corpus,expected", [
@@ -14,3 +16,131 @@ from awsshell.fuzzy import fuzzy_search
 def test_subsequences(search, corpus, expected):
     actual = fuzzy_search(search, corpus)
     assert actual == expected
+
+
+class CountingCorpus(list):
+    def __init__(self, *args):
+        super(CountingCorpus, self).__init__(*args)
+        self.iterations = 0
+
+    def __iter__(self):
+        self.iterations += 1
+        return super(CountingCorpus, self).__iter__()
+
+
+CORPUS = [
+    'describe-instances', 'describe-instance-attribute',
+    'describe-reserved-instances-offerings', 'run-instances',
+    'create-spot-datafeed-subscription', 'delete-tags', 'd', 'ds',
+]
+
+
+@pytest.mark.parametrize("queries", [
+    ['d', 'de', 'des', 'desc', 'descr'],
+    ['d', 'dr', 'dri', 'drio'],
+    ['r', 'ri', 'rin', 'rinstance', 'rinstances'],
+    ['desc', 'des', 'de', 'dex', 'd'],
+    ['run', 'x', 'xy', 'ru'],
+])
+def test_fuzzy_session_matches_fuzzy_search(queries):
+    session = FuzzySession(CORPUS)
+    for query in queries:
+        assert session.search(query) == fuzzy_search(query, CORPUS)
+
+
+def test_fuzzy_session_only_rescans_matches_on_extension():
+    corpus = CountingCorpus(CORPUS)
+    session = FuzzySession(corpus)
+    session.search('d')
+    assert corpus.iterations == 1
+    session.search('de')
+    session.search('des')
+    assert corpus.iterations == 1
+    # Deleting a character requires a full scan.
+    session.search('de')
+    assert corpus.iterations == 2
+
+
+@pytest.mark.parametrize("search", ['d', 'de', 'drio', 'rinst', 's', 'x'])
+@pytest.mark.parametrize("limit", [0, 1, 2, 3, 100])
+def test_limit_returns_best_matches(search, limit):
+    # Include duplicates so there are ties in the scores.
+    corpus = CORPUS + ['describe-tags', 'x-1', 'x-2'] * 2
+    expected = fuzzy_search(search, corpus)[:limit]
+    assert fuzzy_search(search, corpus, limit=limit) == expected
+    assert FuzzySession(corpus).search(search, limit=limit) == expected
+
+
+@pytest.mark.parametrize("search", [
+    'd', 'drio', 'rinst', 'zz', 'x', u'\u2713'])
+def test_fuzzy_corpus_matches_list(search):
+    corpus = CORPUS + [u'check-\u2713', 'x-1']
+    expected = fuzzy_search(search, corpus)
+    assert fuzzy_search(search, FuzzyCorpus(corpus)) == expected
+    assert fuzzy_search(search, FuzzyCorpus(corpus), limit=2) == expected[:2]
+    assert FuzzySession(FuzzyCorpus(corpus)).search(search) == expected
+
+
+def test_fuzzy_corpus_skips_words_missing_characters():
+    corpus = FuzzyCorpus(['abc', 'abd', 'xyz', 'ab'])
+    assert list(corpus.possible_matches('abc')) == ['abc']
+    assert list(corpus.possible_matches('ba')) == ['abc', 'abd', 'ab']
+
+
+@pytest.mark.parametrize("search,word,score", [
+    ('a', 'a', 1.0),
+    ('a', 'ab', 0.5),
+    ('ab', 'ab', 1.0),
+    ('b', 'ab', 0.5),
+    ('ib', 'a-b-ib', 0.95),
+    ('bb', 'abb', 1 - 1 / 3.0),
+    ('ab', 'a-b', 0.95),
+    ('abc', 'ab', 0),
+    ('x', 'ab', 0),
+    ('', 'ab', 0),
+])
+def test_calculate_score(search, word, score):
+    assert calculate_score(search, word) == score
+
+
+@pytest.fixture
+def scalar_only(monkeypatch):
+    # Ensure fuzzy_search() on a list never uses numpy.
+    monkeypatch.setattr(fuzzy, 'VECTORIZE_THRESHOLD', float('inf'))
+
+
+@pytest.mark.parametrize("search", [
+    'd', 'de', 'drio', 'rinst', 'ds', 'zz', 'x', 'x-', '-', '', u'\u2713',
+    u'\x00', 'describe-instances', 'describe-instancesx'])
+@pytest.mark.parametrize("limit", [None, 0, 1, 3])
+def test_vectorized_corpus_matches_fuzzy_search(search, limit, scalar_only):
+    pytest.importorskip('numpy')
+    corpus = CORPUS + [u'check-\u2713', 'x-1', 'x-2', '', u'a\x00b', 'x-1']
+    expected = fuzzy_search(search, corpus, limit=limit)
+    assert VectorizedCorpus(corpus).search(search, limit=limit) == expected
+
+
+def test_vectorized_corpus_can_be_empty():
+    pytest.importorskip('numpy')
+    assert VectorizedCorpus([]).search('a') == []
+    assert VectorizedCorpus(['']).search('a') == []
+
+
+def test_large_corpus_is_vectorized(monkeypatch):
+    pytest.importorskip('numpy')
+    corpus = FuzzyCorpus(CORPUS)
+    expected = fuzzy_search('drio', corpus)
+    monkeypatch.setattr(fuzzy, 'VECTORIZE_THRESHOLD', len(CORPUS))
+    assert fuzzy_search('drio', corpus) == expected
+    # The encoded words are reused by later searches.
+    vectorized = corpus.vectorized()
+    assert vectorized is corpus.vectorized()
+    assert fuzzy_search('rinst', corpus, limit=1) == ['run-instances']
+
+
+def test_large_corpus_without_numpy(monkeypatch):
+    expected = fuzzy_search('rinst', CORPUS)
+    monkeypatch.setattr(fuzzy, 'numpy', None)
+    monkeypatch.setattr(fuzzy, 'VECTORIZE_THRESHOLD', 0)
+    assert fuzzy_search('rinst', CORPUS) == expected
+    assert fuzzy_search('rinst', FuzzyCorpus(CORPUS)) == expected
@@ -1,5 +1,9 @@
+import json
 import textwrap
+
 from awsshell import makeindex
+from awsshell import db
+
 
 def test_can_convert_rst_text():
     content = textwrap.dedent("""\
@@ -27,3 +31,198 @@ def test_can_convert_rst_text():
 
         Literal text: --foo-bar
     """)
+
+
+OPERATION_DOCS = textwrap.dedent("""\
+
+
+    Starts instances.
+
+
+    SYNOPSIS
+
+         start-instances
+       --instance-ids <value>
+       [--dry-run | --no-dry-run]
+
+
+    OPTIONS
+
+    --instance-ids (list)
+
+       The IDs of the instances, see --dry-run.
+
+    --dry-run | --no-dry-run (boolean)
+
+       Checks whether you have the required permissions.
+
+    See 'aws help' for descriptions of global parameters.
+
+
+    EXAMPLES
+
+    **To start an instance**
+
+
+    OUTPUT
+
+    StartingInstances -> (list)
+""")
+
+
+def test_can_split_doc_sections():
+    sections = makeindex.split_doc_sections(OPERATION_DOCS)
+    assert [name for name, _ in sections] == [
+        'description', 'synopsis', '--instance-ids', '--dry-run',
+        '--no-dry-run', 'examples', 'output']
+    sections = dict(sections)
+    assert sections['description'] == '\n\nStarts instances.\n\n\n'
+    assert sections['synopsis'].startswith('     start-instances\n')
+    assert sections['--instance-ids'] == (
+        '--instance-ids (list)\n\n'
+        '   The IDs of the instances, see --dry-run.')
+    assert sections['--dry-run'] == sections['--no-dry-run'] == (
+        '--dry-run | --no-dry-run (boolean)\n\n'
+        '   Checks whether you have the required permissions.')
+    assert sections['examples'] == '**To start an instance**'
+    assert sections['output'] == 'StartingInstances -> (list)'
+
+
+def test_can_split_wrapped_option_names():
+    sections = dict(makeindex.split_doc_sections(
+        'SYNOPSIS\n\nOPTIONS\n\n'
+        '--should-decrement | --no-should-\ndecrement\n(boolean)\n\n'
+        '   Whether to decrement.\n'))
+    assert '--should-decrement' in sections
+    assert '--no-should-decrement' in sections
+
+
+def test_docs_without_synopsis_only_have_description():
+    docs = '\n\nAmazon EC2.\n\nAVAILABLE COMMANDS\n\n* run-instances\n'
+    assert makeindex.split_doc_sections(docs) == [('description', docs)]
+
+
+class FakeCommand(object):
+    def __init__(self, lineage_names, subcommands=None):
+        self.lineage_names = lineage_names
+        self.command_table = {}
+        for name in subcommands or []:
+            self.command_table[name] = FakeCommand(lineage_names + [name])
+
+    def create_help_command(self):
+        # The help command only needs a command table.
+        return self
+
+
+def test_copies_docs_for_unchanged_services(tmpdir, monkeypatch):
+    monkeypatch.setattr(
+        makeindex, 'render_docs_for_cmd',
+        lambda help_command: 'new %s' % '.'.join(help_command.lineage_names))
+    previous = db.ConcurrentDBM.create(tmpdir.join('previous').strpath)
+    previous['aws.ec2#description'] = 'old ec2'
+    previous['aws.ec2.run-instances#description'] = 'old ec2.run-instances'
+    previous['aws.s3#description'] = 'old s3'
+    previous['__fingerprints__'] = json.dumps({'ec2': 'a', 's3': 'b'})
+    previous['__complete__'] = 'true'
+    new = db.ConcurrentDBM.create(tmpdir.join('new').strpath)
+    help_command = FakeCommand([], ['ec2', 's3'])
+    help_command.command_table['ec2'] = FakeCommand(
+        ['ec2'], ['run-instances'])
+    fingerprints = {'ec2': 'a', 's3': 'changed'}
+    makeindex.do_write_doc_index(
+        new, help_command, close_db_on_finish=False,
+        fingerprints=fingerprints, previous_db=previous)
+    assert new['aws.ec2#description'] == 'old ec2'
+    assert new['aws.ec2.run-instances#description'] == \
+        'old ec2.run-instances'
+    assert new['aws.s3#description'] == 'new s3'
+    assert json.loads(new['__fingerprints__']) == fingerprints
+    assert new['__complete__'] == 'true'
+
+
+def test_incomplete_previous_docs_are_not_copied(tmpdir, monkeypatch):
+    monkeypatch.setattr(makeindex, 'render_docs_for_cmd',
+                        lambda help_command: 'new')
+    previous = db.ConcurrentDBM.create(tmpdir.join('previous').strpath)
+    previous['aws.ec2#description'] = 'old'
+    previous['__fingerprints__'] = json.dumps({'ec2': 'a'})
+    new = {}
+    makeindex.do_write_doc_index(
+        new, FakeCommand([], ['ec2']), close_db_on_finish=False,
+        fingerprints={'ec2': 'a'}, previous_db=previous)
+    assert new['aws.ec2#description'] == 'new'
+
+
+def test_docs_that_are_not_split_are_not_copied(tmpdir, monkeypatch):
+    monkeypatch.setattr(makeindex, 'render_docs_for_cmd',
+                        lambda help_command: 'new')
+    previous = db.ConcurrentDBM.create(tmpdir.join('previous').strpath)
+    previous['aws.ec2'] = 'old'
+    previous['__fingerprints__'] = json.dumps({'ec2': 'a'})
+    previous['__complete__'] = 'true'
+    new = {}
+    makeindex.do_write_doc_index(
+        new, FakeCommand([], ['ec2']), close_db_on_finish=False,
+        fingerprints={'ec2': 'a'}, previous_db=previous)
+    assert new['aws.ec2#description'] == 'new'
+    assert 'aws.ec2' not in new
+
+
+def test_resumes_partially_written_docs(monkeypatch):
+    rendered = []
+
+    def render_docs_for_cmd(help_command):
+        name = '.'.join(help_command.lineage_names)
+        rendered.append(name)
+        return 'new %s' % name
+
+    monkeypatch.setattr(makeindex, 'render_docs_for_cmd',
+                        render_docs_for_cmd)
+    # The docs of ec2 were written before the last run was
+    # interrupted, s3 was only partially written.
+    db = {
+        'aws.ec2#description': 'old ec2',
+        '__done__.ec2': 'a',
+        'aws.s3#description': 'old s3',
+    }
+    help_command = FakeCommand([], ['ec2', 's3'])
+    help_command.command_table['s3'] = FakeCommand(['s3'], ['ls'])
+    makeindex.do_write_doc_index(
+        db, help_command, close_db_on_finish=False,
+        fingerprints={'ec2': 'a', 's3': 'b'})
+    assert rendered == ['s3', 's3.ls']
+    assert db['aws.ec2#description'] == 'old ec2'
+    assert db['aws.s3#description'] == 'new s3'
+    assert db['__done__.s3'] == 'b'
+    assert db['__complete__'] == 'true'
+
+
+def test_done_services_with_a_new_fingerprint_are_written_again(
+        monkeypatch):
+    monkeypatch.setattr(makeindex, 'render_docs_for_cmd',
+                        lambda help_command: 'new')
+    db = {'aws.ec2#description': 'old', '__done__.ec2': 'a'}
+    makeindex.do_write_doc_index(
+        db, FakeCommand([], ['ec2']), close_db_on_finish=False,
+        fingerprints={'ec2': 'changed'})
+    assert db['aws.ec2#description'] == 'new'
+    assert db['__done__.ec2'] == 'changed'
+
+
+def test_user_doc_index_is_written_at_low_priority(monkeypatch):
+    calls = []
+    monkeypatch.setattr(makeindex, '_lower_priority',
+                        lambda: calls.append('lower_priority'))
+    monkeypatch.setattr(makeindex.signal, 'signal', lambda *args: None)
+    monkeypatch.setattr(
+        makeindex, 'write_doc_index',
+        lambda filename, **kwargs: calls.append((filename, kwargs)))
+    monkeypatch.setattr(makeindex, 'find_previous_doc_index_filename',
+                        lambda dirname: '%s/previous.docs' % dirname)
+    assert makeindex.main(['--user-doc-index', '/cache/new.docs',
+                           '-p', '2']) == 0
+    assert calls == [
+        'lower_priority',
+        ('/cache/new.docs', {'processes': 2,
+                             'previous_filename': '/cache/previous.docs'}),
+    ]
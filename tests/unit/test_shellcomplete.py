@@ -0,0 +1,135 @@
+import copy
+
+import mock
+import pytest
+from prompt_toolkit.completion import CompleteEvent
+from prompt_toolkit.document import Document
+
+from awsshell import shellcomplete
+from awsshell.autocomplete import AWSCLIModelCompleter
+from awsshell.fuzzy import fuzzy_search
+from awsshell.shellcomplete import AWSShellCompleter
+
+
+@pytest.fixture
+def index_data():
+    return {
+        'aws': {
+            'arguments': ['--region', '--debug'],
+            'argument_metadata': {
+                '--region': {'required': False, 'type_name': 'string',
+                             'minidoc': 'The region.', 'example': '',
+                             'api_name': ''},
+                '--debug': {'required': False, 'type_name': 'boolean',
+                            'minidoc': 'Debug logging.', 'example': '',
+                            'api_name': ''},
+            },
+            'commands': ['ec2'],
+            'children': {
+                'ec2': {
+                    'arguments': [],
+                    'argument_metadata': {},
+                    'commands': ['create-tags'],
+                    'children': {
+                        'create-tags': {
+                            'arguments': ['--resources', '--region'],
+                            'argument_metadata': {
+                                '--resources': {
+                                    'required': True, 'type_name': 'list',
+                                    'minidoc': 'The resources.',
+                                    'example': '', 'api_name': 'Resources'},
+                                '--region': {
+                                    'required': False, 'type_name': 'string',
+                                    'minidoc': 'A local region.',
+                                    'example': '', 'api_name': 'Region'},
+                            },
+                            'commands': [],
+                            'children': {},
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+def get_completions(completer, text, complete_event=None):
+    return list(completer.get_completions(Document(text, len(text)),
+                                          complete_event))
+
+
+def create_completer(index_data, server_side_results=None):
+    server_side_completer = mock.Mock()
+    server_side_completer.retrieve_candidate_values.return_value = \
+        server_side_results or []
+    return AWSShellCompleter(AWSCLIModelCompleter(index_data),
+                             server_side_completer)
+
+
+def test_completions_include_arg_metadata(index_data):
+    completer = create_completer(index_data)
+    completions = get_completions(completer, 'ec2 create-tags --res')
+    assert [c.text for c in completions] == ['--resources']
+    assert completions[0].display == '--resources (required)'
+    assert completions[0].display_meta == '[list] The resources.'
+
+
+def test_global_arg_metadata_used_for_global_options(index_data):
+    completer = create_completer(index_data)
+    completions = get_completions(completer, 'ec2 create-tags --deb')
+    assert completions[0].display_meta == '[boolean] Debug logging.'
+
+
+def test_local_arg_metadata_takes_precedence(index_data):
+    completer = create_completer(index_data)
+    completions = get_completions(completer, 'ec2 create-tags --reg')
+    assert completions[0].display_meta == '[string] A local region.'
+
+
+def test_completions_do_not_modify_index(index_data):
+    original = copy.deepcopy(index_data)
+    completer = create_completer(index_data)
+    session = [
+        'ec2 create-tags --resources i-1234 --debug --region us-west-2 ',
+        'ec2 --debug ',
+        '--reg',
+    ]
+    for line in session:
+        for i in range(len(line) + 1):
+            get_completions(completer, line[:i])
+    assert index_data == original
+    assert len(index_data['aws']['children']['ec2']['argument_metadata']) == 0
+
+
+def test_server_side_completions_limited_while_typing(index_data):
+    instance_ids = ['i-%05d' % i for i in range(1000)]
+    completer = create_completer(index_data, instance_ids)
+    line = 'ec2 create-tags --resources i-0'
+    completions = get_completions(
+        completer, line, CompleteEvent(text_inserted=True))
+    assert len(completions) == shellcomplete.MAX_SERVER_SIDE_COMPLETIONS
+    assert [c.text for c in completions] == fuzzy_search(
+        'i-0', instance_ids)[:len(completions)]
+    # If the user explicitly asks for completions, we give them
+    # everything.
+    completions = get_completions(
+        completer, line, CompleteEvent(completion_requested=True))
+    assert len(completions) == 1000
+
+
+def test_profile_change_clears_completion_cache(index_data):
+    completer = create_completer(index_data)
+    get_completions(completer, 'ec2 create-tags --res')
+    cache = completer.completer.completion_cache
+    assert len(cache) == 1
+    with mock.patch.object(completer, '_create_server_side_completer'):
+        completer.change_profile('foo')
+    assert len(cache) == 0
+
+
+def test_new_completer_clears_completion_cache(index_data):
+    completer = create_completer(index_data)
+    get_completions(completer, 'ec2 create-tags --res')
+    cache = completer.completer.completion_cache
+    completer.completer = AWSCLIModelCompleter(index_data)
+    assert len(cache) == 0
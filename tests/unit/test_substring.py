@@ -12,7 +12,7 @@
 # language governing permissions and limitations under the License.
 import pytest
 
-from awsshell.substring import substring_search
+from awsshell.substring import substring_search, PrefixIndex
 
 
 @pytest.mark.parametrize("search,corpus,expected", [
@@ -23,3 +23,27 @@ from awsshell.substring import substring_search
 def test_subsequences(search, corpus, expected):
     actual = substring_search(search, corpus)
     assert actual == expected
+
+
+@pytest.mark.parametrize("search,corpus,expected", [
+    ('', ['b', 'a'], ['a', 'b']),
+    ('foo', ['foobar', 'foo', 'fo', 'fop', 'foobaz'],
+     ['foo', 'foobar', 'foobaz']),
+    ('--q', ['--query', '--debug', '--query-ec2', '--q'],
+     ['--q', '--query', '--query-ec2']),
+    ('zz', ['a', 'b'], []),
+    ('a', ['a', 'a', 'b'], ['a', 'a']),
+])
+def test_prefix_index_search(search, corpus, expected):
+    assert PrefixIndex(corpus).search(search) == expected
+
+
+def test_prefix_index_matches_substring_search():
+    corpus = ['describe-%s' % name for name in
+              ['instances', 'images', 'hosts', 'tags', 'volumes']]
+    corpus += ['create-tags', 'create-image', 'run-instances', 'd', '']
+    index = PrefixIndex(corpus)
+    for word in ['', 'd', 'de', 'describe-i', 'create-', 'x', 'run']:
+        expected = [item for item in sorted(corpus)
+                    if item.startswith(word)]
+        assert index.search(word) == expected
@@ -57,3 +57,15 @@ class ToolbarTest(unittest.TestCase):
             (Token.Toolbar, ' [F9] Focus: cli '),
             (Token.Toolbar, ' [F10] Exit ')]
         assert expected == self.toolbar.handler(self.cli)
+
+    def test_toolbar_index_progress(self):
+        self.cli.current_buffer_name = 'DEFAULT_BUFFER'
+        progress = [(3, 10)]
+        toolbar = Toolbar(
+            lambda: True, lambda: True, lambda: True, lambda: True,
+            lambda: progress[0])
+        items = toolbar.handler(self.cli)
+        assert items[-1] == (Token.Toolbar.Off, ' Indexing: 3/10 ')
+        # The item goes away when the index is built.
+        progress[0] = None
+        assert toolbar.handler(self.cli)[-1] == (Token.Toolbar, ' [F10] Exit ')
@@ -6,7 +6,13 @@ import shutil
 from awsshell.utils import FSLayer
 from awsshell.utils import InMemoryFSLayer
 from awsshell.utils import FileReadError
+from awsshell.utils import FileWriteError
 from awsshell.utils import temporary_file
+from awsshell.utils import LayeredMapping
+from awsshell.utils import LRUCache
+from awsshell.utils import other_versions
+from awsshell.utils import shared_index_dirs
+from awsshell.utils import SYSTEM_INDEX_DIR
 
 
 class TestFSLayer(unittest.TestCase):
@@ -46,6 +52,53 @@ class TestFSLayer(unittest.TestCase):
         with self.assertRaises(FileReadError):
             self.fslayer.file_contents('/tmp/thisdoesnot-exist.asdf')
 
+    def test_can_write_file_contents(self):
+        filename = os.path.join(self.tempdir, 'subdir', 'foo')
+        self.fslayer.write_file_contents(filename, b'\x00binary', binary=True)
+        self.assertEqual(
+            self.fslayer.file_contents(filename, binary=True), b'\x00binary')
+        self.fslayer.write_file_contents(filename, 'text')
+        self.assertEqual(self.fslayer.file_contents(filename), 'text')
+
+    def test_can_map_file(self):
+        with open(self.temporary_filename, 'wb') as f:
+            f.write(b'helloworld')
+        contents = self.fslayer.map_file(self.temporary_filename)
+        try:
+            self.assertEqual(len(contents), 10)
+            self.assertEqual(contents[5:], b'world')
+        finally:
+            contents.close()
+
+    def test_map_empty_file_error(self):
+        with open(self.temporary_filename, 'wb'):
+            pass
+        with self.assertRaises(FileReadError):
+            self.fslayer.map_file(self.temporary_filename)
+
+    def test_write_error(self):
+        with self.assertRaises(FileWriteError):
+            self.fslayer.write_file_contents(self.tempdir, 'foo')
+
+    def test_write_replaces_file_without_leaving_temp_files(self):
+        self.fslayer.write_file_contents(self.temporary_filename, 'first')
+        self.fslayer.write_file_contents(self.temporary_filename, 'second')
+        self.assertEqual(
+            self.fslayer.file_contents(self.temporary_filename), 'second')
+        self.assertEqual(os.listdir(self.tempdir), ['tempfilefoo'])
+
+    def test_list_files(self):
+        with open(self.temporary_filename, 'w'):
+            pass
+        os.mkdir(os.path.join(self.tempdir, 'subdir'))
+        self.assertEqual(self.fslayer.list_files(self.tempdir),
+                         ['tempfilefoo'])
+
+    def test_list_files_of_missing_directory(self):
+        self.assertEqual(
+            self.fslayer.list_files(os.path.join(self.tempdir, 'missing')),
+            [])
+
 
 class TestInMemoryFSLayer(unittest.TestCase):
     def setUp(self):
@@ -62,10 +115,50 @@ class TestInMemoryFSLayer(unittest.TestCase):
         self.assertEqual(self.fslayer.file_contents('/myfile', binary=True),
                          b'helloworld')
 
+    def test_can_map_file(self):
+        self.file_mapping['/myfile'] = 'helloworld'
+        self.assertEqual(self.fslayer.map_file('/myfile')[5:], b'world')
+
+    def test_can_write_binary_contents(self):
+        self.fslayer.write_file_contents('/myfile', b'\x00', binary=True)
+        self.assertEqual(self.fslayer.file_contents('/myfile', binary=True),
+                         b'\x00')
+
     def test_file_does_not_exist_error(self):
         with self.assertRaises(FileReadError):
             self.fslayer.file_contents('/tmp/thisdoesnot-exist.asdf')
 
+    def test_list_files(self):
+        self.file_mapping['/cache/foo'] = ''
+        self.file_mapping['/cache/sub/bar'] = ''
+        self.assertEqual(self.fslayer.list_files('/cache'), ['foo'])
+
+
+class TestOtherVersions(unittest.TestCase):
+    def test_newest_version_first(self):
+        filenames = ['completions-1.9.2.json', 'completions-1.10.1.json',
+                     'completions-1.10.1.bin', 'completions-1.11.0.json',
+                     'other.json']
+        self.assertEqual(
+            other_versions(filenames, 'completions-%s.json', '1.11.0'),
+            ['completions-1.10.1.json', 'completions-1.9.2.json'])
+
+    def test_non_numeric_versions(self):
+        filenames = ['1.10.x-docs', '1.10.1-docs', '1.9-docs']
+        self.assertEqual(
+            other_versions(filenames, '%s-docs', '1.11.0'),
+            ['1.10.1-docs', '1.10.x-docs', '1.9-docs'])
+
+
+class TestSharedIndexDirs(unittest.TestCase):
+    def test_system_dir_by_default(self):
+        self.assertEqual(shared_index_dirs({}), [SYSTEM_INDEX_DIR])
+
+    def test_env_var_dirs_come_first(self):
+        environ = {'AWS_SHELL_INDEX_PATH': os.pathsep.join(['/a', '', '/b'])}
+        self.assertEqual(shared_index_dirs(environ),
+                         ['/a', '/b', SYSTEM_INDEX_DIR])
+
 
 class TestTemporaryFile(unittest.TestCase):
     def test_can_use_as_context_manager(self):
@@ -93,3 +186,101 @@ class TestTemporaryFile(unittest.TestCase):
             f.seek(0)
             assert f.read() == "foobar"
         self.assertFalse(os.path.isfile(filename))
+
+
+class TestLayeredMapping(unittest.TestCase):
+    def test_earlier_mappings_take_precedence(self):
+        mapping = LayeredMapping({'a': 1}, {'a': 2, 'b': 3})
+        self.assertEqual(mapping['a'], 1)
+        self.assertEqual(mapping['b'], 3)
+        self.assertEqual(mapping.get('c'), None)
+        with self.assertRaises(KeyError):
+            mapping['c']
+
+    def test_iterates_over_unique_keys(self):
+        mapping = LayeredMapping({'a': 1}, {'a': 2, 'b': 3})
+        self.assertEqual(sorted(mapping), ['a', 'b'])
+        self.assertEqual(len(mapping), 2)
+        self.assertEqual(dict(mapping), {'a': 1, 'b': 3})
+
+    def test_reflects_changes_to_underlying_mappings(self):
+        local = {}
+        mapping = LayeredMapping(local, {'a': 2})
+        local['a'] = 1
+        self.assertEqual(mapping['a'], 1)
+
+    def test_does_not_support_assignment(self):
+        mapping = LayeredMapping({'a': 1})
+        with self.assertRaises(TypeError):
+            mapping['a'] = 2
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_and_put(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('b', 2), 2)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # Using 'a' makes 'b' the least recently used key.
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_put_replaces_value(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('a', 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('a'), 2)
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get('a'), None)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_evicts_by_size(self):
+        cache = LRUCache(5, get_size=len)
+        cache.put('a', 'aa')
+        cache.put('b', 'bb')
+        cache.put('c', 'cc')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.size, 4)
+        # Replacing a value updates the size.
+        cache.put('b', 'b')
+        self.assertEqual(cache.size, 3)
+        cache.put('d', 'dd')
+        self.assertEqual(sorted(['b', 'c', 'd']),
+                         sorted(k for k in 'abcd' if k in cache))
+
+    def test_value_larger_than_cache_is_not_cached(self):
+        cache = LRUCache(5, get_size=len)
+        cache.put('a', 'aa')
+        cache.put('b', 'b' * 6)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(cache.size, 2)
+
+    def test_evicts_in_least_recently_used_order(self):
+        cache = LRUCache(3)
+        for key in 'abcd':
+            cache.put(key, key)
+        cache.get('b')
+        cache.put('e', 'e')
+        cache.put('f', 'f')
+        self.assertEqual(sorted(k for k in 'abcdef' if k in cache),
+                         ['b', 'e', 'f'])